@@ -1,11 +1,19 @@
-from typing import Dict
+from typing import Dict, List, Optional
 from models.schemas import TicketDataInput, KBDraft
+from core.config import CONDENSE_MAX_CONCURRENCY
 from core.llm_interface import get_llm_response, KB_CREATION_PROMPT_TEMPLATE
+from agents.log_condenser import condense_conversation_log
+from core.profiling import stage
 from db.in_memory_db import save_draft
 import datetime
 import re
 
-def parse_llm_kb_response(markdown_text: str) -> Dict[str, str]:
+DEFAULT_KB_SECTION_HEADERS = [
+    "Problem Description", "Environment", "Cause",
+    "Resolution Steps", "Suggested Tags"
+]
+
+def parse_llm_kb_response(markdown_text: str, section_headers: Optional[List[str]] = None) -> Dict[str, str]:
     """
     Parses the LLM's Markdown response into structured sections.
     This is a simple parser; more robust parsing might be needed.
@@ -16,10 +24,7 @@ def parse_llm_kb_response(markdown_text: str) -> Dict[str, str]:
 
     # A more specific regex to capture only the desired sections
     # This regex looks for "## Section Name" and captures "Section Name"
-    section_headers = [
-        "Problem Description", "Environment", "Cause",
-        "Resolution Steps", "Suggested Tags"
-    ]
+    section_headers = section_headers or DEFAULT_KB_SECTION_HEADERS
     # Create a regex pattern like (Problem Description|Environment|Cause|Resolution Steps|Suggested Tags)
     pattern_str = "|".join(re.escape(header) for header in section_headers)
     section_regex = re.compile(r"^##\s*(" + pattern_str + r")\s*$", re.MULTILINE)
@@ -48,19 +53,43 @@ def parse_llm_kb_response(markdown_text: str) -> Dict[str, str]:
     return sections
 
 
-def create_kb_draft_from_ticket(ticket_data: TicketDataInput) -> KBDraft:
-    prompt = KB_CREATION_PROMPT_TEMPLATE.format(
+def build_kb_creation_prompt(ticket_data: TicketDataInput, conversation_log: Optional[str] = None) -> str:
+    # conversation_log overrides the ticket's own log (e.g. with its condensed form), even when
+    # condensation left nothing of it
+    if conversation_log is None:
+        conversation_log = ticket_data.conversation_log
+    return KB_CREATION_PROMPT_TEMPLATE.format(
         ticket_title=ticket_data.title,
         ticket_description=ticket_data.description,
         ticket_resolution=ticket_data.resolution_details,
-        ticket_conversation=ticket_data.conversation_log or "N/A"
+        ticket_conversation=conversation_log or "N/A"
     )
 
-    llm_generated_markdown = get_llm_response(prompt)
+
+def create_kb_draft_from_ticket(ticket_data: TicketDataInput, save: bool = True,
+                                condense_max_concurrency: int = CONDENSE_MAX_CONCURRENCY) -> KBDraft:
+    """
+    Generates a KB draft from a resolved ticket. With save=False the draft is only
+    returned, letting bulk callers persist drafts themselves. `condense_max_concurrency`
+    bounds the parallel LLM calls used to condense a long conversation log.
+    """
+    with stage("condense_log"):
+        conversation_log, condensation_report = condense_conversation_log(
+            ticket_data.conversation_log, max_concurrency=condense_max_concurrency
+        )
+    if condensation_report and condensation_report.tokens_saved:
+        print(f"Ticket {ticket_data.ticket_id}: conversation log {condensation_report.original_tokens} -> "
+              f"{condensation_report.final_tokens} tokens ({condensation_report.tokens_saved} saved, "
+              f"{condensation_report.segments} segments condensed)")
+    prompt = build_kb_creation_prompt(ticket_data, conversation_log)
+
+    with stage("llm_generate_draft"):
+        llm_generated_markdown = get_llm_response(prompt)
 
     # Try to parse common sections for easier access, but store full markdown
     # This parsing is basic and might need to be more robust.
-    parsed_sections = parse_llm_kb_response(llm_generated_markdown)
+    with stage("parse_response"):
+        parsed_sections = parse_llm_kb_response(llm_generated_markdown)
     
     # Attempt to extract a title (e.g., first H1 if LLM doesn't make one, or use ticket title)
     # For simplicity, let's derive title from ticket if not easily parsable from LLM
@@ -84,7 +113,9 @@ def create_kb_draft_from_ticket(ticket_data: TicketDataInput) -> KBDraft:
         problem_description=parsed_sections.get("Problem Description"),
         cause=parsed_sections.get("Cause"),
         resolution_steps=parsed_sections.get("Resolution Steps"),
-        created_at=now_iso
+        created_at=now_iso,
+        log_condensation=condensation_report
     )
-    save_draft(draft)
+    if save:
+        save_draft(draft)
     return draft
\ No newline at end of file
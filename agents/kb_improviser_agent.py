@@ -1,18 +1,136 @@
-# Placeholder for KB Improviser Agent
-# This agent is more complex and would involve:
-# - Comparing new info (e.g., a new ticket, user feedback) with an existing KB.
-# - Using an LLM to suggest specific changes.
-# - Storing these suggestions for supervisor review.
-
-def suggest_kb_improvements(kb_id: str, new_information: str):
-    # 1. Fetch existing KB content for kb_id
-    # 2. Construct a prompt for an LLM:
-    #    "Given this existing KB article: [KB_content]
-    #     And this new information: [new_information]
-    #     Suggest specific improvements or additions to the KB article.
-    #     Output changes in a diff-like format or as specific instructions."
-    # 3. Call LLM
-    # 4. Parse suggestions
-    # 5. Store suggestions linked to kb_id
-    print(f"KB Improviser: Suggesting improvements for {kb_id} based on: {new_information[:50]}...")
-    return {"suggestion_id": "improv-suggest-123", "message": "Improvement suggestions pending."}
\ No newline at end of file
+# KB Improviser Agent
+# Compares new information (user feedback, newly resolved tickets) with published KBs
+# and stores LLM-generated improvement suggestions for supervisor review.
+#
+# For ticket streams the expensive parts are batched:
+# - tickets are embedded in batches (one provider call per batch),
+# - each batch is scored against the published-KB vector index with one matmul per shard,
+# - only the best KB per ticket above the threshold is kept,
+# - all tickets that hit the same KB are folded into one LLM prompt.
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import datetime
+
+from models.schemas import TicketDataInput, KBArticle, KBImprovementSuggestion
+from core.config import (
+    IMPROVER_SIMILARITY_THRESHOLD, IMPROVER_EMBED_BATCH_SIZE,
+    IMPROVER_MAX_TICKETS_PER_SUGGESTION
+)
+from core.embedding_interface import get_embeddings_batch
+from core.llm_interface import get_llm_response, KB_IMPROVEMENT_PROMPT_TEMPLATE
+from agents.kb_creator_agent import parse_llm_kb_response
+from db.in_memory_db import get_published_kb, get_vector_shard_keys, match_published_kbs, save_suggestion
+
+IMPROVEMENT_SECTION_HEADERS = ["Suggested Changes", "Reasoning"]
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _ticket_embedding_text(ticket: TicketDataInput) -> str:
+    # Mirrors the "Title/Content" layout used when published KBs are embedded
+    return f"Title: {ticket.title}\nContent: {ticket.description}\n{ticket.resolution_details}"
+
+
+def similarity_join(ticket_embeddings: List[List[float]],
+                    threshold: float) -> List[Optional[Tuple[KBArticle, float]]]:
+    """
+    Scores every ticket against every published KB at once and returns, per ticket,
+    (best-matching KB, cosine score), or None if the best score is below threshold.
+    """
+    return [
+        hit if hit is not None and hit[1] >= threshold else None
+        for hit in match_published_kbs(ticket_embeddings)
+    ]
+
+
+def match_tickets_to_kbs(tickets: Iterable[TicketDataInput],
+                         batch_size: int = IMPROVER_EMBED_BATCH_SIZE,
+                         threshold: float = IMPROVER_SIMILARITY_THRESHOLD
+                         ) -> Dict[str, List[Tuple[TicketDataInput, float]]]:
+    """
+    Consumes a ticket stream batch by batch and groups tickets by their best-matching KB.
+    Returns kb_id -> [(ticket, score), ...].
+    """
+    matches: Dict[str, List[Tuple[TicketDataInput, float]]] = {}
+    if not get_vector_shard_keys():
+        return matches
+
+    for batch in _batched(tickets, max(1, batch_size)):
+        embeddings = get_embeddings_batch([_ticket_embedding_text(t) for t in batch])
+        for ticket, hit in zip(batch, similarity_join(embeddings, threshold)):
+            if hit is None:
+                continue
+            article, score = hit
+            matches.setdefault(article.kb_id, []).append((ticket, score))
+    return matches
+
+
+def _format_ticket_evidence(ticket: TicketDataInput, score: float) -> str:
+    return (
+        f"Ticket {ticket.ticket_id} (similarity {score:.2f}): {ticket.title}\n"
+        f"Description: {ticket.description}\n"
+        f"Resolution: {ticket.resolution_details}"
+    )
+
+
+def suggest_kb_improvements(kb_id: str, new_information: str,
+                            source_info: str = "Manual submission") -> Optional[KBImprovementSuggestion]:
+    """Stores an LLM-generated suggestion for `kb_id`. Returns None if the KB is unknown or the LLM call failed."""
+    kb = get_published_kb(kb_id)
+    if not kb:
+        return None
+
+    prompt = KB_IMPROVEMENT_PROMPT_TEMPLATE.format(
+        kb_title=kb.title,
+        kb_content=kb.content_markdown,
+        new_information=new_information
+    )
+    llm_response = get_llm_response(prompt)
+    # get_llm_response reports failures as text; don't queue them for review
+    if llm_response.startswith("Error:"):
+        print(f"KB Improviser: LLM call failed for {kb_id} ({source_info}); no suggestion stored. {llm_response}")
+        return None
+    parsed_sections = parse_llm_kb_response(llm_response, IMPROVEMENT_SECTION_HEADERS)
+
+    suggestion = KBImprovementSuggestion(
+        kb_id=kb_id,
+        source_info=source_info,
+        # Fall back to the raw response if the sections could not be parsed
+        suggested_changes=parsed_sections.get("Suggested Changes") or llm_response,
+        reasoning=parsed_sections.get("Reasoning"),
+        created_at=datetime.datetime.now(datetime.timezone.utc).isoformat()
+    )
+    save_suggestion(suggestion)
+    print(f"KB Improviser: Stored suggestion {suggestion.suggestion_id} for {kb_id} ({source_info}).")
+    return suggestion
+
+
+def suggest_improvements_from_tickets(tickets: Iterable[TicketDataInput],
+                                      batch_size: int = IMPROVER_EMBED_BATCH_SIZE,
+                                      threshold: float = IMPROVER_SIMILARITY_THRESHOLD,
+                                      max_tickets_per_kb: int = IMPROVER_MAX_TICKETS_PER_SUGGESTION
+                                      ) -> List[KBImprovementSuggestion]:
+    """
+    Runs the batched pipeline over a stream of resolved tickets:
+    one LLM call per matched KB, covering its highest-scoring tickets.
+    """
+    matches = match_tickets_to_kbs(tickets, batch_size=batch_size, threshold=threshold)
+
+    suggestions = []
+    for kb_id, hits in matches.items():
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        top_hits = hits[:max(1, max_tickets_per_kb)]
+        new_information = "\n\n".join(_format_ticket_evidence(t, score) for t, score in top_hits)
+        source_info = "Tickets: " + ", ".join(t.ticket_id for t, _ in top_hits)
+        suggestion = suggest_kb_improvements(kb_id, new_information, source_info)
+        if suggestion:
+            suggestions.append(suggestion)
+    return suggestions
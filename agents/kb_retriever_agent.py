@@ -1,6 +1,13 @@
-from models.schemas import KBSearchQuery, KBSearchResultItem, KBSearchResponse
+from typing import List, Optional, Set, Tuple
+import re
+
+from models.schemas import (
+    KBSearchQuery, KBSearchResultItem, KBSearchResultItemProjection, KBSearchProjectedResponse, KBArticle, LLMUsage
+)
+from core.config import RAG_CONTEXT_TOKEN_BUDGET, RAG_ANSWER_MAX_TOKENS
 from core.embedding_interface import get_embedding
-from core.llm_interface import get_llm_response # For RAG answer synthesis
+from core.llm_interface import get_llm_response_with_usage, count_tokens, truncate_to_tokens # For RAG answer synthesis
+from core.profiling import stage
 from db.in_memory_db import search_vector_store
 
 RAG_PROMPT_TEMPLATE = """
@@ -18,34 +25,139 @@ Knowledge Base Excerpts:
 Answer:
 """
 
-def search_knowledge_base(search_query: KBSearchQuery, synthesize_answer: bool = False) -> KBSearchResponse:
-    query_embedding = get_embedding(search_query.query)
-    
+# Passages sharing at least this fraction of word trigrams with an already selected passage are dropped
+PASSAGE_OVERLAP_THRESHOLD = 0.8
+# Don't bother appending a truncated passage smaller than this
+MIN_PARTIAL_PASSAGE_TOKENS = 32
+
+
+def _split_passages(markdown: str) -> List[str]:
+    # Blank-line separated blocks keep headers, lists and steps together
+    return [block.strip() for block in re.split(r"\n\s*\n", markdown) if block.strip()]
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _is_duplicate(shingles: Set[Tuple[str, ...]], selected: List[Set[Tuple[str, ...]]]) -> bool:
+    if not shingles:
+        return True
+    for other in selected:
+        overlap = len(shingles & other) / min(len(shingles), len(other) or 1)
+        if overlap >= PASSAGE_OVERLAP_THRESHOLD:
+            return True
+    return False
+
+
+def assemble_rag_context(scored_articles: List[Tuple[KBArticle, float]], token_budget: int) -> Tuple[str, int]:
+    """
+    Fills `token_budget` with passages from the highest-scoring articles first, skipping
+    passages that overlap ones already chosen. Returns (context_str, context_tokens).
+    """
+    parts: List[str] = []
+    used_tokens = 0
+    selected_shingles: List[Set[Tuple[str, ...]]] = []
+
+    for article, _score in sorted(scored_articles, key=lambda x: x[1], reverse=True):
+        header = f"Title: {article.title}\nContent:"
+        header_tokens = count_tokens(header) + 2 # Includes the trailing "---" separator
+        article_passages = []
+        article_tokens = header_tokens
+
+        for passage in _split_passages(article.content_markdown):
+            shingles = _shingles(passage)
+            if _is_duplicate(shingles, selected_shingles):
+                continue
+            passage_tokens = count_tokens(passage) + 1
+            remaining = token_budget - used_tokens - article_tokens
+            if passage_tokens > remaining:
+                if remaining >= MIN_PARTIAL_PASSAGE_TOKENS:
+                    truncated = truncate_to_tokens(passage, remaining - 1)
+                    truncated_tokens = count_tokens(truncated) + 1
+                    # Re-encoding a cut can merge differently; never let it overshoot the budget
+                    if truncated_tokens <= remaining:
+                        article_passages.append(truncated)
+                        article_tokens += truncated_tokens
+                break
+            article_passages.append(passage)
+            article_tokens += passage_tokens
+            selected_shingles.append(shingles)
+
+        if article_passages:
+            parts.append(header + "\n" + "\n".join(article_passages) + "\n---")
+            used_tokens += article_tokens
+        if token_budget - used_tokens < MIN_PARTIAL_PASSAGE_TOKENS:
+            break
+
+    return "\n".join(parts), used_tokens
+
+
+def _project_search_result(article: KBArticle, score: float, fields: Set[str]) -> KBSearchResultItemProjection:
+    """
+    Builds a result item holding only `fields`, straight from the scored article, so
+    unrequested fields are never computed and stay unset for response_model_exclude_unset.
+    """
+    values = {}
+    if "kb_id" in fields:
+        values["kb_id"] = article.kb_id
+    if "title" in fields:
+        values["title"] = article.title
+    if "content_snippet" in fields:
+        # Create a snippet (e.g., first 200 chars of content)
+        content = article.content_markdown
+        values["content_snippet"] = content[:200] + "..." if len(content) > 200 else content
+    if "score" in fields:
+        values["score"] = score
+    if "full_content_markdown" in fields:
+        values["full_content_markdown"] = article.content_markdown
+    return KBSearchResultItemProjection(**values)
+
+
+def search_knowledge_base(search_query: KBSearchQuery, synthesize_answer: bool = False,
+                          include_full_content: bool = False,
+                          fields: Optional[Set[str]] = None) -> KBSearchProjectedResponse:
+    """
+    Searches the KB and returns result items projected to `fields` (all KBSearchResultItem
+    fields by default). Full bodies are opt-in: full_content_markdown is only returned when
+    include_full_content is set or it is named in `fields`; the UI only renders snippets.
+    """
+    if fields is None:
+        fields = set(KBSearchResultItem.model_fields)
+        if not include_full_content:
+            fields.discard("full_content_markdown")
+
+    with stage("embed_query"):
+        query_embedding = get_embedding(search_query.query)
+
     # Perform semantic search
     # search_vector_store returns List[Tuple[KBArticle, float_score]]
-    scored_articles_tuples = search_vector_store(query_embedding, search_query.top_k)
+    with stage("vector_search"):
+        scored_articles_tuples = search_vector_store(query_embedding, search_query.top_k, search_query.shards)
 
-    results = []
-    for article, score in scored_articles_tuples:
-        # Create a snippet (e.g., first 200 chars of content)
-        snippet = article.content_markdown[:200] + "..." if len(article.content_markdown) > 200 else article.content_markdown
-        results.append(KBSearchResultItem(
-            kb_id=article.kb_id,
-            title=article.title,
-            content_snippet=snippet,
-            score=score,
-            full_content_markdown=article.content_markdown # Send full content for Gradio to display
-        ))
+    results = [_project_search_result(article, score, fields) for article, score in scored_articles_tuples]
 
     synthesized_answer_text = None
+    usage = None
     if synthesize_answer and results:
-        # Prepare context for RAG
-        context_parts = []
-        for item in results: # Use top N results for context
-            context_parts.append(f"Title: {item.title}\nContent: {item.content_snippet}\n---") # Use snippet or full content
-        context_str = "\n".join(context_parts)
-        
+        # Prepare context for RAG from full article content, bounded by the token budget
+        token_budget = search_query.context_token_budget or RAG_CONTEXT_TOKEN_BUDGET
+        with stage("assemble_context"):
+            context_str, context_tokens = assemble_rag_context(scored_articles_tuples, token_budget)
+
         rag_prompt = RAG_PROMPT_TEMPLATE.format(query=search_query.query, context_str=context_str)
-        synthesized_answer_text = get_llm_response(rag_prompt, max_tokens=300)
+        with stage("llm_answer"):
+            synthesized_answer_text, token_counts = get_llm_response_with_usage(rag_prompt, max_tokens=RAG_ANSWER_MAX_TOKENS)
+        usage = LLMUsage(
+            prompt_tokens=token_counts["prompt_tokens"],
+            completion_tokens=token_counts["completion_tokens"],
+            context_tokens=context_tokens,
+            context_token_budget=token_budget
+        )
+        print(f"RAG usage: prompt={usage.prompt_tokens}, completion={usage.completion_tokens}, "
+              f"context={context_tokens}/{token_budget} tokens")
 
-    return KBSearchResponse(results=results, synthesized_answer=synthesized_answer_text)
\ No newline at end of file
+    return KBSearchProjectedResponse(results=results, synthesized_answer=synthesized_answer_text, usage=usage)
@@ -0,0 +1,189 @@
+# Conversation log condensation for the KB Creator Agent.
+# Long escalation threads are first stripped of boilerplate (signatures, quoted replies)
+# and, if still over the token threshold, condensed map-reduce style: the log is split
+# into segments that are summarized in parallel and merged in their original order.
+# Merged summaries that are still over the threshold are condensed again (bounded rounds).
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import re
+
+from models.schemas import LogCondensationReport
+from core.config import (
+    CONDENSE_LOG_TOKEN_THRESHOLD, CONDENSE_SEGMENT_TOKENS,
+    CONDENSE_MAX_CONCURRENCY, CONDENSE_SEGMENT_MAX_OUTPUT_TOKENS, CONDENSE_MAX_REDUCE_ROUNDS
+)
+from core.llm_interface import get_llm_response, count_tokens, truncate_to_tokens, LOG_CONDENSE_PROMPT_TEMPLATE
+
+_QUOTED_LINE = re.compile(r"^\s*>")
+_REPLY_HEADER = re.compile(r"^\s*On .{0,200}\bwrote:\s*$", re.IGNORECASE)
+_ORIGINAL_MESSAGE = re.compile(r"^\s*-{2,}\s*(Original Message|Forwarded message)\s*-{2,}\s*$", re.IGNORECASE)
+_MAIL_HEADER = re.compile(r"^\s*(From|Sent|Date|To|Cc|Bcc|Subject):", re.IGNORECASE)
+_SPEAKER_TURN = re.compile(r"^\s*[A-Z][\w .'-]{0,40}:\s")
+# Signature lines that look like speaker turns ("Phone: 555-1234") but don't end the signature
+_CONTACT_FIELD = re.compile(
+    r"^\s*(Phone|Tel|Telephone|Mobile|Cell|Fax|E-?mail|Web|Website|Address|Office|Direct|Skype|LinkedIn|Twitter|Pronouns)\s*:",
+    re.IGNORECASE
+)
+_SIGNATURE_DELIMITER = re.compile(r"^\s*--\s*$")
+_MOBILE_FOOTER = re.compile(r"^\s*Sent from my \w+", re.IGNORECASE)
+_CONFIDENTIALITY_NOTICE = re.compile(r"^\s*(CONFIDENTIALITY NOTICE|This (e-?mail|message) (and any attachments )?(is|are) confidential)", re.IGNORECASE)
+
+# Chat logs rarely have blank lines, so a signature block is cut off after this many lines
+SIGNATURE_MAX_LINES = 4
+
+
+def strip_boilerplate(log: str) -> str:
+    """
+    Deterministically removes quoted replies, forwarded/original-message blocks,
+    signature blocks and mail footers, then collapses blank runs and repeated lines.
+    """
+    kept: List[str] = []
+    in_signature = False
+    signature_lines = 0
+    in_original_message = False
+
+    for line in log.splitlines():
+        stripped = line.strip()
+
+        if in_signature:
+            # A signature runs until the next blank line or speaker turn, and never past a few lines
+            signature_lines += 1
+            if not stripped:
+                in_signature = False
+                continue
+            if (_SPEAKER_TURN.match(line) and not _CONTACT_FIELD.match(line)) or signature_lines > SIGNATURE_MAX_LINES:
+                in_signature = False
+            else:
+                continue
+        if in_original_message:
+            # The copied thread runs until the next speaker turn that isn't a mail header
+            if _SPEAKER_TURN.match(line) and not _MAIL_HEADER.match(line):
+                in_original_message = False
+            else:
+                continue
+
+        if _SIGNATURE_DELIMITER.match(line):
+            in_signature, signature_lines = True, 0
+            continue
+        if _ORIGINAL_MESSAGE.match(line):
+            in_original_message = True
+            continue
+        if (_QUOTED_LINE.match(line) or _REPLY_HEADER.match(line)
+                or _MOBILE_FOOTER.match(line) or _CONFIDENTIALITY_NOTICE.match(line)):
+            continue
+
+        if not stripped and (not kept or not kept[-1].strip()):
+            continue # Collapse runs of blank lines
+        if stripped and kept and kept[-1].strip() == stripped:
+            continue # Drop immediately repeated lines
+        kept.append(line.rstrip())
+
+    return "\n".join(kept).strip()
+
+
+def split_into_segments(text: str, segment_tokens: int) -> List[str]:
+    """Splits on line boundaries into segments of at most ~segment_tokens tokens."""
+    segments: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for line in text.splitlines():
+        line_tokens = count_tokens(line) + 1
+        if line_tokens > segment_tokens:
+            # A single oversized line is cut by characters (~4 per token)
+            if current:
+                segments.append("\n".join(current))
+                current, current_tokens = [], 0
+            step = segment_tokens * 4
+            segments.extend(line[i:i + step] for i in range(0, len(line), step))
+            continue
+        if current and current_tokens + line_tokens > segment_tokens:
+            segments.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+
+    if current:
+        segments.append("\n".join(current))
+    return segments
+
+
+def build_segment_prompt(index: int, total: int, segment: str) -> str:
+    return LOG_CONDENSE_PROMPT_TEMPLATE.format(segment_number=index + 1, segment_count=total, segment=segment)
+
+
+def _condense_segment(args: Tuple[int, int, str]) -> str:
+    index, total, segment = args
+    prompt = build_segment_prompt(index, total, segment)
+    condensed = get_llm_response(prompt, max_tokens=CONDENSE_SEGMENT_MAX_OUTPUT_TOKENS, temperature=0.0)
+    # get_llm_response reports failures as text; keep the original segment rather than lose it
+    if condensed.startswith("Error:"):
+        return segment
+    return condensed
+
+
+def plan_condensation(log: str, token_threshold: int = CONDENSE_LOG_TOKEN_THRESHOLD,
+                      segment_tokens: int = CONDENSE_SEGMENT_TOKENS) -> Tuple[str, List[str]]:
+    """
+    Returns (stripped_log, segments) without any LLM calls; `segments` is empty when the
+    stripped log is within `token_threshold` and would be sent as is.
+    """
+    stripped = strip_boilerplate(log)
+    if count_tokens(stripped) <= token_threshold:
+        return stripped, []
+    return stripped, split_into_segments(stripped, segment_tokens)
+
+
+def _condense_segments(segments: List[str], max_concurrency: int) -> str:
+    work = [(i, len(segments), segment) for i, segment in enumerate(segments)]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(segments)))) as pool:
+        condensed_segments = list(pool.map(_condense_segment, work)) # map keeps segment order
+    return "\n".join(condensed_segments)
+
+
+def condense_conversation_log(log: Optional[str],
+                              token_threshold: int = CONDENSE_LOG_TOKEN_THRESHOLD,
+                              segment_tokens: int = CONDENSE_SEGMENT_TOKENS,
+                              max_concurrency: int = CONDENSE_MAX_CONCURRENCY,
+                              max_reduce_rounds: int = CONDENSE_MAX_REDUCE_ROUNDS
+                              ) -> Tuple[Optional[str], Optional[LogCondensationReport]]:
+    """
+    Returns (log_for_prompt, report). Logs at or under `token_threshold` after boilerplate
+    stripping are passed through without any LLM calls. Condensed logs are re-condensed for
+    up to `max_reduce_rounds` rounds and finally truncated, so the result always fits the threshold.
+    """
+    if not log:
+        return log, None
+
+    original_tokens = count_tokens(log)
+    stripped, segments = plan_condensation(log, token_threshold, segment_tokens)
+    stripped_tokens = count_tokens(stripped)
+
+    result = stripped
+    condensed_count = 0
+    if segments:
+        result = _condense_segments(segments, max_concurrency)
+        condensed_count = len(segments)
+        result_tokens = count_tokens(result)
+        for _ in range(max(0, max_reduce_rounds)):
+            if result_tokens <= token_threshold:
+                break
+            segments = split_into_segments(result, segment_tokens)
+            reduced = _condense_segments(segments, max_concurrency)
+            condensed_count += len(segments)
+            reduced_tokens = count_tokens(reduced)
+            if reduced_tokens >= result_tokens:
+                break # No progress (e.g. the LLM is failing and segments come back unchanged)
+            result, result_tokens = reduced, reduced_tokens
+        if result_tokens > token_threshold:
+            result = truncate_to_tokens(result, token_threshold)
+
+    final_tokens = count_tokens(result)
+    report = LogCondensationReport(
+        original_tokens=original_tokens,
+        stripped_tokens=stripped_tokens,
+        final_tokens=final_tokens,
+        segments=condensed_count,
+        tokens_saved=max(original_tokens - final_tokens, 0)
+    )
+    return result, report
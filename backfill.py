@@ -0,0 +1,282 @@
+"""
+Offline bulk backfill: turns historical resolved tickets into KB drafts.
+
+Reads TicketDataInput records from a JSONL file (one JSON object per line) as a stream,
+runs create_kb_draft_from_ticket across a bounded thread pool, and appends the drafts to
+an output JSONL file in batches. Each worker condenses long conversation logs one segment
+at a time, so --workers is the bound on concurrent LLM calls. Ticket IDs are recorded in a checkpoint file only after
+their drafts have been flushed, so an interrupted run can be resumed with the same command.
+
+Usage:
+    python backfill.py tickets.jsonl --output drafts.jsonl --workers 8
+    python backfill.py tickets.jsonl --dry-run --price-per-1k-prompt 0.0005
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+from typing import Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+
+from models.schemas import TicketDataInput, KBDraft
+from agents.kb_creator_agent import create_kb_draft_from_ticket, build_kb_creation_prompt
+from agents.log_condenser import plan_condensation, build_segment_prompt
+from core.config import (
+    CONDENSE_LOG_TOKEN_THRESHOLD, CONDENSE_SEGMENT_TOKENS,
+    CONDENSE_SEGMENT_MAX_OUTPUT_TOKENS, CONDENSE_MAX_REDUCE_ROUNDS
+)
+from core.llm_interface import count_tokens
+
+
+def iter_ticket_records(path: str) -> Iterator[Tuple[int, Optional[TicketDataInput], Optional[str]]]:
+    """
+    Yields (line_number, ticket, error) for each non-blank line without loading the whole file.
+    Malformed lines are reported via `error` instead of aborting the run.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, TicketDataInput(**json.loads(line)), None
+            except (json.JSONDecodeError, ValidationError, TypeError) as e:
+                yield line_number, None, str(e)
+
+
+def count_records(path: str) -> int:
+    # Cheap streaming pass so progress can show an ETA
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+class DraftBatchWriter:
+    """Buffers drafts and appends them to the output file, then checkpoints their ticket IDs."""
+
+    def __init__(self, output_path: str, checkpoint_path: str, batch_size: int):
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.buffer: List[KBDraft] = []
+
+    def add(self, draft: KBDraft):
+        self.buffer.append(draft)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        with open(self.output_path, "a", encoding="utf-8") as out:
+            out.write("".join(draft.model_dump_json() + "\n" for draft in self.buffer))
+            out.flush()
+            os.fsync(out.fileno())
+        # Checkpoint strictly after the drafts are durable, so a crash can only cause re-work
+        with open(self.checkpoint_path, "a", encoding="utf-8") as ckpt:
+            ckpt.write("".join(draft.source_ticket_id + "\n" for draft in self.buffer))
+            ckpt.flush()
+            os.fsync(ckpt.fileno())
+        self.buffer = []
+
+
+class ProgressReporter:
+    def __init__(self, total: int, interval_seconds: float):
+        self.total = total
+        self.interval_seconds = interval_seconds
+        self.started_at = time.monotonic()
+        self.last_report = 0.0
+        self.done = 0
+        self.failed = 0
+
+    def update(self, ok: bool, force: bool = False):
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+        self.report(force)
+
+    def report(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_report < self.interval_seconds:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started_at, 1e-9)
+        processed = self.done + self.failed
+        rate = processed / elapsed
+        remaining = max(self.total - processed, 0)
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "unknown"
+        print(f"[backfill] {processed}/{self.total} processed ({self.done} ok, {self.failed} failed), "
+              f"{rate:.2f} tickets/s, elapsed {elapsed:.0f}s, ETA {eta}", flush=True)
+
+
+def _generate_draft(ticket: TicketDataInput) -> KBDraft:
+    # Sequential condensation keeps each worker to one LLM call at a time
+    draft = create_kb_draft_from_ticket(ticket, save=False, condense_max_concurrency=1)
+    # get_llm_response reports failures as text; don't checkpoint those so they are retried
+    if draft.generated_content_markdown.startswith("Error:"):
+        raise RuntimeError(draft.generated_content_markdown)
+    return draft
+
+
+def run_backfill(input_path: str, output_path: str, checkpoint_path: str, workers: int,
+                 batch_size: int, progress_interval: float) -> int:
+    completed = load_checkpoint(checkpoint_path)
+    total = max(count_records(input_path) - len(completed), 0)
+    print(f"[backfill] Resuming with {len(completed)} tickets already checkpointed." if completed
+          else "[backfill] Starting fresh run.")
+
+    writer = DraftBatchWriter(output_path, checkpoint_path, batch_size)
+    progress = ProgressReporter(total, progress_interval)
+    # Bound in-flight work so the input is never read far ahead of the workers
+    max_in_flight = workers * 2
+    in_flight = {}
+
+    def drain(return_when):
+        finished, _ = wait(in_flight, return_when=return_when)
+        for future in finished:
+            ticket_id = in_flight.pop(future)
+            try:
+                writer.add(future.result())
+                progress.update(ok=True)
+            except Exception as e:
+                print(f"[backfill] Ticket {ticket_id} failed: {e}", file=sys.stderr)
+                progress.update(ok=False)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for line_number, ticket, error in iter_ticket_records(input_path):
+                if error:
+                    print(f"[backfill] Skipping line {line_number}: {error}", file=sys.stderr)
+                    progress.update(ok=False)
+                    continue
+                if ticket.ticket_id in completed:
+                    continue
+                completed.add(ticket.ticket_id) # Guards against duplicate IDs within the file
+                in_flight[pool.submit(_generate_draft, ticket)] = ticket.ticket_id
+                if len(in_flight) >= max_in_flight:
+                    drain(FIRST_COMPLETED)
+            if in_flight:
+                drain(ALL_COMPLETED)
+    finally:
+        writer.flush()
+        progress.report(force=True)
+    return 1 if progress.failed else 0
+
+
+def _estimate_ticket_tokens(ticket: TicketDataInput) -> Tuple[int, int, int, int]:
+    """
+    Returns (condense_calls, condense_prompt_tokens, condense_completion_tokens, draft_prompt_tokens)
+    following the same stripping, segmentation and reduce rounds as condense_conversation_log.
+    Condensed segments are assumed to use their full output budget, so long logs are over-
+    rather than under-estimated.
+    """
+    if not ticket.conversation_log:
+        return 0, 0, 0, count_tokens(build_kb_creation_prompt(ticket))
+    stripped, segments = plan_condensation(ticket.conversation_log)
+    if not segments:
+        return 0, 0, 0, count_tokens(build_kb_creation_prompt(ticket, stripped))
+
+    condense_calls = len(segments)
+    condense_prompt_tokens = sum(
+        count_tokens(build_segment_prompt(i, len(segments), segment)) for i, segment in enumerate(segments)
+    )
+    merged_tokens = len(segments) * CONDENSE_SEGMENT_MAX_OUTPUT_TOKENS
+    condense_completion_tokens = merged_tokens
+    template_tokens = count_tokens(build_segment_prompt(0, 1, ""))
+    for _ in range(max(0, CONDENSE_MAX_REDUCE_ROUNDS)):
+        if merged_tokens <= CONDENSE_LOG_TOKEN_THRESHOLD:
+            break
+        round_segments = -(-merged_tokens // CONDENSE_SEGMENT_TOKENS) # ceil
+        condense_calls += round_segments
+        condense_prompt_tokens += merged_tokens + round_segments * template_tokens
+        condense_completion_tokens += round_segments * CONDENSE_SEGMENT_MAX_OUTPUT_TOKENS
+        merged_tokens = min(merged_tokens, round_segments * CONDENSE_SEGMENT_MAX_OUTPUT_TOKENS)
+    final_log_tokens = min(merged_tokens, CONDENSE_LOG_TOKEN_THRESHOLD)
+    draft_prompt_tokens = count_tokens(build_kb_creation_prompt(ticket, "")) + final_log_tokens
+    return condense_calls, condense_prompt_tokens, condense_completion_tokens, draft_prompt_tokens
+
+
+def run_dry_run(input_path: str, checkpoint_path: str, completion_tokens_per_ticket: int,
+                price_per_1k_prompt: float, price_per_1k_completion: float) -> int:
+    """
+    Estimates LLM token usage and cost without calling the LLM. Tickets a real run would
+    skip (already checkpointed, or a repeated ID) are left out of the estimate.
+    """
+    completed = load_checkpoint(checkpoint_path)
+    seen: Set[str] = set()
+    tickets = invalid = checkpointed = duplicates = 0
+    condense_calls = condense_prompt_tokens = condense_completion_tokens = 0
+    draft_prompt_tokens = 0
+    for line_number, ticket, error in iter_ticket_records(input_path):
+        if error:
+            invalid += 1
+            continue
+        if ticket.ticket_id in completed:
+            checkpointed += 1
+            continue
+        if ticket.ticket_id in seen:
+            duplicates += 1
+            continue
+        seen.add(ticket.ticket_id)
+        tickets += 1
+        calls, c_prompt, c_completion, d_prompt = _estimate_ticket_tokens(ticket)
+        condense_calls += calls
+        condense_prompt_tokens += c_prompt
+        condense_completion_tokens += c_completion
+        draft_prompt_tokens += d_prompt
+
+    prompt_tokens = condense_prompt_tokens + draft_prompt_tokens
+    completion_tokens = condense_completion_tokens + tickets * completion_tokens_per_ticket
+    cost = prompt_tokens / 1000 * price_per_1k_prompt + completion_tokens / 1000 * price_per_1k_completion
+    print(f"[dry-run] Tickets: {tickets} (invalid lines: {invalid}, already checkpointed: {checkpointed}, "
+          f"duplicate IDs: {duplicates})")
+    print(f"[dry-run] Log condensation: {condense_calls} calls, {condense_prompt_tokens} prompt tokens, "
+          f"up to {condense_completion_tokens} completion tokens")
+    print(f"[dry-run] Draft prompt tokens: {draft_prompt_tokens} (avg {draft_prompt_tokens / max(tickets, 1):.0f}/ticket)")
+    print(f"[dry-run] Total prompt tokens: {prompt_tokens}")
+    print(f"[dry-run] Estimated completion tokens: {completion_tokens}")
+    print(f"[dry-run] Estimated cost: ${cost:.2f}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-generate KB drafts from historical tickets (JSONL).")
+    parser.add_argument("input", help="JSONL file with one TicketDataInput object per line")
+    parser.add_argument("--output", default="drafts.jsonl", help="JSONL file drafts are appended to")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Concurrent LLM calls (log condensation runs sequentially within each worker)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Drafts per output write")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--dry-run", action="store_true", help="Only estimate token usage and cost")
+    parser.add_argument("--completion-tokens", type=int, default=600, help="Assumed completion tokens per draft (dry run)")
+    parser.add_argument("--price-per-1k-prompt", type=float, default=0.0, help="USD per 1K prompt tokens (dry run)")
+    parser.add_argument("--price-per-1k-completion", type=float, default=0.0, help="USD per 1K completion tokens (dry run)")
+    args = parser.parse_args(argv)
+
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+    if args.dry_run:
+        return run_dry_run(args.input, checkpoint_path, args.completion_tokens,
+                           args.price_per_1k_prompt, args.price_per_1k_completion)
+    return run_backfill(
+        args.input,
+        args.output,
+        checkpoint_path,
+        max(1, args.workers),
+        max(1, args.batch_size),
+        args.progress_interval
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
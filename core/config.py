@@ -24,8 +24,12 @@ LLM_PROVIDER_DEFAULT = os.getenv("LLM_PROVIDER_DEFAULT", "openai").lower()
 # So, for embeddings, we'll likely stick to OpenAI or SentenceTransformers for now.
 # If you find an OpenRouter model that's good for embeddings and accessible via chat completions,
 # you might adapt, but it's less straightforward.
-EMBEDDING_PROVIDER_DEFAULT = os.getenv("EMBEDDING_PROVIDER_DEFAULT", "openai").lower() # or "sentence_transformers"
+EMBEDDING_PROVIDER_DEFAULT = os.getenv("EMBEDDING_PROVIDER_DEFAULT", "openai").lower() # or "sentence_transformers", "hashing"
 SENTENCE_TRANSFORMER_MODEL_DEFAULT = "all-MiniLM-L6-v2"
+# Local hashing embedder (no model download): character n-gram TF features hashed into a fixed dimension.
+# Also used as the offline fallback whenever the configured provider is unavailable.
+HASHING_EMBEDDING_MODEL_NAME = "hashing-char-ngram"
+HASHING_EMBEDDING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", "1024"))
 
 # Select actual models based on provider choice
 if LLM_PROVIDER_DEFAULT == "openrouter" and OPENROUTER_API_KEY:
@@ -50,9 +54,53 @@ if EMBEDDING_PROVIDER_DEFAULT == "openai" and OPENAI_API_KEY:
     EMBEDDING_MODEL_ACTIVE = EMBEDDING_MODEL_DEFAULT_OPENAI
 elif EMBEDDING_PROVIDER_DEFAULT == "sentence_transformers":
     EMBEDDING_MODEL_ACTIVE = SENTENCE_TRANSFORMER_MODEL_DEFAULT
+elif EMBEDDING_PROVIDER_DEFAULT == "hashing":
+    EMBEDDING_MODEL_ACTIVE = HASHING_EMBEDDING_MODEL_NAME
 else:
-    EMBEDDING_MODEL_ACTIVE = None # Or a default mock
-    print("Warning: Embedding provider not properly configured. Embeddings might be mocked.")
+    EMBEDDING_MODEL_ACTIVE = None
+    print("Warning: Embedding provider not properly configured. Falling back to the local hashing embedder.")
+
+# KB Improviser configuration
+# Tickets whose best cosine similarity to a published KB is below this threshold are ignored.
+IMPROVER_SIMILARITY_THRESHOLD = float(os.getenv("IMPROVER_SIMILARITY_THRESHOLD", "0.8"))
+# Number of tickets embedded per provider call when processing a ticket stream.
+IMPROVER_EMBED_BATCH_SIZE = int(os.getenv("IMPROVER_EMBED_BATCH_SIZE", "64"))
+# Upper bound on tickets folded into a single improvement prompt for one KB.
+IMPROVER_MAX_TICKETS_PER_SUGGESTION = int(os.getenv("IMPROVER_MAX_TICKETS_PER_SUGGESTION", "5"))
+
+# Vector index sharding: "none" (single index), "tag" (one shard per product tag, i.e. the
+# article's first tag) or "hash" (VECTOR_HASH_SHARDS shards by kb_id).
+VECTOR_SHARDING = os.getenv("VECTOR_SHARDING", "none").lower()
+VECTOR_HASH_SHARDS = int(os.getenv("VECTOR_HASH_SHARDS", str(os.cpu_count() or 1)))
+# Worker processes for scatter-gather search; used only once the index reaches VECTOR_PARALLEL_MIN_ROWS
+VECTOR_SEARCH_WORKERS = int(os.getenv("VECTOR_SEARCH_WORKERS", str(os.cpu_count() or 1)))
+VECTOR_PARALLEL_MIN_ROWS = int(os.getenv("VECTOR_PARALLEL_MIN_ROWS", "50000"))
+
+# RAG configuration
+# Default token budget for the knowledge base excerpts sent with a RAG prompt (overridable per request).
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+RAG_ANSWER_MAX_TOKENS = int(os.getenv("RAG_ANSWER_MAX_TOKENS", "300"))
+
+# Conversation log condensation (KB Creator)
+# Logs above this many tokens (after boilerplate stripping) are condensed before draft generation.
+CONDENSE_LOG_TOKEN_THRESHOLD = int(os.getenv("CONDENSE_LOG_TOKEN_THRESHOLD", "2000"))
+CONDENSE_SEGMENT_TOKENS = int(os.getenv("CONDENSE_SEGMENT_TOKENS", "1500"))
+CONDENSE_SEGMENT_MAX_OUTPUT_TOKENS = int(os.getenv("CONDENSE_SEGMENT_MAX_OUTPUT_TOKENS", "300"))
+CONDENSE_MAX_CONCURRENCY = int(os.getenv("CONDENSE_MAX_CONCURRENCY", "4"))
+# If the merged segment summaries are still above the threshold they are condensed again,
+# at most this many extra rounds; whatever remains over the threshold is then truncated.
+CONDENSE_MAX_REDUCE_ROUNDS = int(os.getenv("CONDENSE_MAX_REDUCE_ROUNDS", "2"))
+
+# API responses larger than this many bytes are gzip-compressed (when the client accepts it)
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+
+# Diagnostics (admin endpoints under /api/v1/admin require the X-Admin-Key header;
+# they are disabled entirely while ADMIN_API_KEY is unset)
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+SLOW_REQUEST_CAPTURE_ENABLED = os.getenv("SLOW_REQUEST_CAPTURE_ENABLED", "false").lower() == "true"
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "2000"))
+SLOW_REQUEST_BUFFER_SIZE = int(os.getenv("SLOW_REQUEST_BUFFER_SIZE", "100"))
+PROFILER_MAX_DURATION_SECONDS = float(os.getenv("PROFILER_MAX_DURATION_SECONDS", "120"))
 
 # For site_url when using OpenRouter with openai python client
 # It's good to set your site URL or app name.
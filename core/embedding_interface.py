@@ -1,8 +1,11 @@
 from openai import OpenAI as OpenAIClient # Renamed to avoid conflict if we use 'OpenAI' class locally
 from sentence_transformers import SentenceTransformer
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
 from core.config import (
-    OPENAI_API_KEY, EMBEDDING_MODEL_DEFAULT_OPENAI,
+    OPENAI_API_KEY,
     EMBEDDING_PROVIDER_DEFAULT, SENTENCE_TRANSFORMER_MODEL_DEFAULT,
+    HASHING_EMBEDDING_DIM,
     EMBEDDING_MODEL_ACTIVE # This will be set based on provider choice in config
 )
 import numpy as np
@@ -19,14 +22,38 @@ if EMBEDDING_PROVIDER_DEFAULT == "sentence_transformers":
         print(f"SentenceTransformer model '{EMBEDDING_MODEL_ACTIVE}' loaded for embeddings.")
     except Exception as e:
         print(f"Warning: Could not load SentenceTransformer model '{EMBEDDING_MODEL_ACTIVE}': {e}")
-        print("Embeddings will be mocked if SentenceTransformer model fails to load.")
+        print("Embeddings will fall back to the local hashing embedder.")
+
+# Stateless (nothing to fit or download), so one shared instance is safe across threads.
+# Word-boundary character 3-5 grams tolerate typos and product-name variants;
+# sublinear TF + L2 norm keeps long articles from dominating cosine scores.
+hashing_vectorizer = HashingVectorizer(
+    analyzer="char_wb",
+    ngram_range=(3, 5),
+    n_features=HASHING_EMBEDDING_DIM,
+    lowercase=True,
+    norm=None, # Normalized after sublinear TF scaling below
+    alternate_sign=True, # Signed hashing makes collisions cancel out on average
+    dtype=np.float32
+)
+
+def get_hashing_embeddings(texts: list[str]) -> list[list[float]]:
+    """
+    Local, offline embeddings of dimension HASHING_EMBEDDING_DIM. Usable on their own
+    (offline/degraded mode, tests, benchmarks) or as a cheap first-stage retriever.
+    """
+    if not texts:
+        return []
+    features = hashing_vectorizer.transform(texts)
+    # Sublinear TF on the non-zero entries only; sign is kept because of signed hashing
+    features.data = np.sign(features.data) * np.log1p(np.abs(features.data))
+    return normalize(features, norm="l2", copy=False).toarray().tolist()
 
 def get_embedding(text: str, model: str = None) -> list[float]:
     active_embedding_model = model if model else EMBEDDING_MODEL_ACTIVE
 
-    if not active_embedding_model:
-        print("WARN: No active embedding model configured. Returning mock embedding.")
-        return [0.0] * 384 # A common fallback dimension
+    if not active_embedding_model or EMBEDDING_PROVIDER_DEFAULT == "hashing":
+        return get_hashing_embeddings([text])[0]
 
     if EMBEDDING_PROVIDER_DEFAULT == "openai" and openai_embed_client:
         try:
@@ -45,13 +72,37 @@ def get_embedding(text: str, model: str = None) -> list[float]:
             dim = getattr(st_model, 'get_sentence_embedding_dimension', lambda: 384)()
             return [0.0] * dim
     else:
-        print(f"WARN: Embedding provider '{EMBEDDING_PROVIDER_DEFAULT}' or model '{active_embedding_model}' not available. Returning mock embedding.")
-        dim = 1536 if active_embedding_model == EMBEDDING_MODEL_DEFAULT_OPENAI else 384
-        # Simple hash-based mock, ensure it's float
-        mock_emb = [float(ord(char) % 100) / 100.0 for char in text[:dim]]
-        # Pad with zeros if text is shorter than dim
-        mock_emb.extend([0.0] * (dim - len(mock_emb)))
-        return mock_emb
+        # Configured provider unavailable (no key, model failed to load): degrade to local embeddings
+        return get_hashing_embeddings([text])[0]
+
+
+def get_embeddings_batch(texts: list[str], model: str = None) -> list[list[float]]:
+    """
+    Embeds several texts at once. Providers that accept a list of inputs are called
+    a single time for the whole batch instead of once per text.
+    """
+    if not texts:
+        return []
+    active_embedding_model = model if model else EMBEDDING_MODEL_ACTIVE
+
+    if active_embedding_model and EMBEDDING_PROVIDER_DEFAULT == "openai" and openai_embed_client:
+        try:
+            response = openai_embed_client.embeddings.create(input=texts, model=active_embedding_model)
+            # The API returns one item per input, tagged with the input's index
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            print(f"Error calling OpenAI embedding API for a batch of {len(texts)} (model: {active_embedding_model}): {e}")
+            return [[0.0] * 1536 for _ in texts]
+    elif active_embedding_model and EMBEDDING_PROVIDER_DEFAULT == "sentence_transformers" and st_model:
+        try:
+            return st_model.encode(texts).tolist()
+        except Exception as e:
+            print(f"Error using SentenceTransformer (model: {active_embedding_model}) for batch embedding: {e}")
+            dim = getattr(st_model, 'get_sentence_embedding_dimension', lambda: 384)()
+            return [[0.0] * dim for _ in texts]
+
+    # Hashing provider, or configured provider unavailable
+    return get_hashing_embeddings(texts)
 
 
 def cosine_similarity(vec1: list[float], vec2: list[float]) -> float:
@@ -1,3 +1,4 @@
+from typing import Dict, Tuple
 from openai import OpenAI
 from core.config import (
     LLM_PROVIDER_DEFAULT,
@@ -7,6 +8,11 @@ from core.config import (
     LLM_API_KEY_ACTIVE, LLM_API_BASE_ACTIVE, LLM_MODEL_ACTIVE
 )
 
+try:
+    import tiktoken
+except ImportError: # Optional: token counts fall back to a character heuristic
+    tiktoken = None
+
 client = None
 
 if LLM_API_KEY_ACTIVE:
@@ -30,13 +36,23 @@ else:
 
 
 def get_llm_response(prompt: str, model: str = None, max_tokens: int = 1500, temperature: float = 0.3) -> str:
+    text, _ = get_llm_response_with_usage(prompt, model=model, max_tokens=max_tokens, temperature=temperature)
+    return text
+
+def get_llm_response_with_usage(prompt: str, model: str = None, max_tokens: int = 1500,
+                                temperature: float = 0.3) -> Tuple[str, Dict[str, int]]:
+    """
+    Same as get_llm_response, but also returns {"prompt_tokens", "completion_tokens"}.
+    Provider-reported usage is used when available, otherwise tokens are counted locally.
+    """
     if not client:
         print("WARN: LLM client not initialized. Returning mock LLM response.")
-        return f"Mock LLM Response for prompt: {prompt[:100]}..."
+        text = f"Mock LLM Response for prompt: {prompt[:100]}..."
+        return text, {"prompt_tokens": count_tokens(prompt, model), "completion_tokens": count_tokens(text, model)}
 
     active_model = model if model else LLM_MODEL_ACTIVE
     if not active_model:
-        return "Error: No active LLM model configured."
+        return "Error: No active LLM model configured.", {"prompt_tokens": 0, "completion_tokens": 0}
 
     try:
         print(f"Sending request to LLM provider: {LLM_PROVIDER_DEFAULT}, model: {active_model}")
@@ -49,10 +65,59 @@ def get_llm_response(prompt: str, model: str = None, max_tokens: int = 1500, tem
             max_tokens=max_tokens,
             temperature=temperature
         )
-        return response.choices[0].message.content.strip()
+        text = response.choices[0].message.content.strip()
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            return text, {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+        return text, {"prompt_tokens": count_tokens(prompt, active_model), "completion_tokens": count_tokens(text, active_model)}
     except Exception as e:
         print(f"Error calling LLM ({LLM_PROVIDER_DEFAULT} with model {active_model}): {e}")
-        return f"Error: Could not get response from LLM. Provider: {LLM_PROVIDER_DEFAULT}, Model: {active_model}"
+        return (f"Error: Could not get response from LLM. Provider: {LLM_PROVIDER_DEFAULT}, Model: {active_model}",
+                {"prompt_tokens": 0, "completion_tokens": 0})
+
+_tokenizer_cache = {}
+
+def _get_tokenizer(model: str = None):
+    if tiktoken is None:
+        return None
+    active_model = model if model else LLM_MODEL_ACTIVE
+    key = active_model or "default"
+    if key not in _tokenizer_cache:
+        try:
+            # OpenRouter model names ("vendor/model") are not known to tiktoken
+            _tokenizer_cache[key] = tiktoken.encoding_for_model(active_model)
+        except Exception:
+            try:
+                # Downloads the BPE file on first use, which fails on offline hosts
+                _tokenizer_cache[key] = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                print(f"WARN: tiktoken encoding unavailable ({e}). Falling back to character-based token estimates.")
+                _tokenizer_cache[key] = None
+    return _tokenizer_cache[key]
+
+def count_tokens(text: str, model: str = None) -> int:
+    """
+    Counts tokens with the model's tokenizer when tiktoken is available,
+    otherwise estimates ~4 characters per token.
+    """
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer(model)
+    if tokenizer is None:
+        return max(1, len(text) // 4)
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = None) -> str:
+    """Cuts `text` down to at most `max_tokens` tokens (character heuristic without tiktoken)."""
+    if max_tokens <= 0 or not text:
+        return ""
+    tokenizer = _get_tokenizer(model)
+    if tokenizer is None:
+        return text[:max_tokens * 4]
+    tokens = tokenizer.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return tokenizer.decode(tokens[:max_tokens])
 
 # KB_CREATION_PROMPT_TEMPLATE remains the same
 KB_CREATION_PROMPT_TEMPLATE = """
@@ -85,6 +150,44 @@ Do not include any preamble before the first "## Problem Description" section.
 If resolution details are sparse, try to infer logical steps or state that detailed steps are needed.
 """
 
+LOG_CONDENSE_PROMPT_TEMPLATE = """
+You are condensing part {segment_number} of {segment_count} of a support ticket conversation log.
+Summarize this part so it can be used to write a knowledge base article.
+Keep every technical detail: error messages, product versions, configuration values,
+commands, troubleshooting steps tried and their outcomes, and who did what.
+Drop greetings, pleasantries and repetition. Output plain text, no preamble.
+
+Conversation Log Part:
+---
+{segment}
+---
+"""
+
+KB_IMPROVEMENT_PROMPT_TEMPLATE = """
+You are an expert technical writer maintaining a knowledge base.
+Given an existing KB article and new information (user feedback or recently resolved tickets
+that matched this article), suggest specific improvements to the article.
+
+Existing KB Article:
+---
+Title: {kb_title}
+{kb_content}
+---
+
+New Information:
+---
+{new_information}
+---
+
+Output in Markdown with exactly the following sections:
+## Suggested Changes
+[A bulleted list of concrete edits: outdated parts to fix, missing steps, environments or causes to add.
+Write "No changes needed" if the article already covers the new information.]
+
+## Reasoning
+[Short explanation of why each change is needed, referencing the new information]
+"""
+
 # RAG_PROMPT_TEMPLATE (from kb_retriever_agent.py, could also live here)
 RAG_PROMPT_TEMPLATE = """
 Based on the following knowledge base article excerpts, answer the user's question.
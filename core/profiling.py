@@ -0,0 +1,253 @@
+# Runtime diagnostics for the API: an on-demand sampling profiler and slow-request capture.
+# Both are off by default and can be switched on at runtime through the admin endpoints.
+# While off, the ASGI middleware forwards requests untouched and `stage()` blocks are a
+# single context-variable lookup, so the overhead is negligible.
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+import datetime
+import os
+import sys
+import threading
+import time
+
+from core.config import (
+    SLOW_REQUEST_CAPTURE_ENABLED, SLOW_REQUEST_THRESHOLD_MS, SLOW_REQUEST_BUFFER_SIZE,
+    PROFILER_MAX_DURATION_SECONDS
+)
+
+
+class RequestTrace:
+    __slots__ = ("method", "path", "started_at", "start", "stages")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self.start = time.perf_counter()
+        self.stages: List[Dict] = []
+
+    def to_dict(self, duration_ms: float, status_code: Optional[int]) -> Dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(duration_ms, 2),
+            "status_code": status_code,
+            "stages": self.stages,
+        }
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("kbflow_request_trace", default=None)
+
+
+class stage:
+    """
+    Times a named block within the current request trace:
+
+        with stage("vector_search"):
+            ...
+
+    Does nothing when no trace is being recorded.
+    """
+    __slots__ = ("name", "trace", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _current_trace.get()
+        if self.trace is not None:
+            # Stages may run off the event loop (e.g. in a threadpool), so sample their thread too
+            sampling_profiler.enter_request_thread()
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is not None:
+            sampling_profiler.exit_request_thread()
+            now = time.perf_counter()
+            self.trace.stages.append({
+                "stage": self.name,
+                "offset_ms": round((self.start - self.trace.start) * 1000, 2),
+                "duration_ms": round((now - self.start) * 1000, 2),
+            })
+        return False
+
+
+class SlowRequestRecorder:
+    def __init__(self, enabled: bool, threshold_ms: float, buffer_size: int):
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.traces: deque = deque(maxlen=max(1, buffer_size))
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: Optional[bool] = None, threshold_ms: Optional[float] = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+
+    def record(self, trace: RequestTrace, duration_ms: float, status_code: Optional[int]):
+        if duration_ms >= self.threshold_ms:
+            with self._lock:
+                self.traces.append(trace.to_dict(duration_ms, status_code))
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return list(self.traces)
+
+    def clear(self):
+        with self._lock:
+            self.traces.clear()
+
+
+# Leaf frames (file basename, function) of threads parked waiting for work; never request time
+_IDLE_LEAF_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("base_events.py", "_run_once"),
+    ("connection.py", "wait"),
+}
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAF_FRAMES
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the Python stacks of the threads currently executing requests
+    (via sys._current_frames), aggregating them as collapsed stacks ("a;b;c count") that
+    flamegraph.pl, speedscope or inferno can render. Threads parked in an idle wait are
+    skipped. Runs for a bounded window.
+    """
+
+    def __init__(self):
+        self.request_threads: Counter = Counter() # thread ident -> requests/stages in flight on it
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.started_at: Optional[str] = None
+        self.ends_at: Optional[float] = None
+        self.interval_seconds = 0.01
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def enter_request_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self.request_threads[ident] += 1
+
+    def exit_request_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self.request_threads[ident] -= 1
+            if self.request_threads[ident] <= 0:
+                del self.request_threads[ident]
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration_seconds: float, interval_ms: float) -> bool:
+        if self.running:
+            return False
+        duration_seconds = min(max(duration_seconds, 0.1), PROFILER_MAX_DURATION_SECONDS)
+        with self._lock:
+            self.samples = Counter()
+            self.sample_count = 0
+        self.interval_seconds = max(interval_ms, 1.0) / 1000.0
+        self.started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self.ends_at = time.monotonic() + duration_seconds
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kbflow-sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        while not self._stop.is_set() and time.monotonic() < self.ends_at:
+            if self.request_threads:
+                self._sample()
+            self._stop.wait(self.interval_seconds)
+
+    def _sample(self):
+        with self._lock:
+            request_idents = set(self.request_threads)
+        stacks = []
+        for thread_ident, frame in sys._current_frames().items():
+            if thread_ident not in request_idents or _is_idle(frame):
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stacks.append(";".join(reversed(frames)))
+        with self._lock:
+            self.samples.update(stacks)
+            self.sample_count += 1
+
+    def collapsed_stacks(self) -> str:
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def status(self) -> Dict:
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "seconds_remaining": round(max(self.ends_at - time.monotonic(), 0.0), 1) if self.running else 0.0,
+            "interval_ms": self.interval_seconds * 1000,
+            "samples": self.sample_count,
+            "unique_stacks": len(self.samples),
+        }
+
+
+slow_request_recorder = SlowRequestRecorder(
+    SLOW_REQUEST_CAPTURE_ENABLED, SLOW_REQUEST_THRESHOLD_MS, SLOW_REQUEST_BUFFER_SIZE
+)
+sampling_profiler = SamplingProfiler()
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware: when neither slow-request capture nor the profiler is active,
+    requests are passed straight through to the app.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        capture = slow_request_recorder.enabled
+        profiling = sampling_profiler.running
+        if scope["type"] != "http" or not (capture or profiling):
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope.get("method", ""), scope.get("path", ""))
+        token = _current_trace.set(trace)
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        sampling_profiler.enter_request_thread()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampling_profiler.exit_request_thread()
+            _current_trace.reset(token)
+            if capture:
+                slow_request_recorder.record(trace, (time.perf_counter() - trace.start) * 1000, status_code)
@@ -1,17 +1,36 @@
 from typing import Dict, List, Optional, Tuple
-from models.schemas import KBDraft, KBArticle
-from core.embedding_interface import get_embedding, cosine_similarity # For retriever part
+from models.schemas import KBDraft, KBArticle, KBImprovementSuggestion
+from core.embedding_interface import get_embedding, get_embeddings_batch # For retriever part
+from core.config import VECTOR_SHARDING, VECTOR_HASH_SHARDS, VECTOR_SEARCH_WORKERS, VECTOR_PARALLEL_MIN_ROWS
+from db.sharded_index import ShardedVectorIndex
 import datetime
+import itertools
 
 # In-memory storage (replace with a real DB for production)
 db_drafts: Dict[str, KBDraft] = {}
 db_published_kbs: Dict[str, KBArticle] = {}
+# draft_id -> insertion sequence; kept after a draft is published so it still works as a page cursor
+_draft_sequence: Dict[str, int] = {}
+_draft_counter = itertools.count()
 
 # For RAG: Mimic a vector store with embeddings
 # In a real system, use ChromaDB, FAISS, Pinecone, Weaviate etc.
 vector_store_mimic: Dict[str, Tuple[KBArticle, List[float]]] = {} # kb_id -> (article_data, embedding)
 
+# Sharded search index over vector_store_mimic; each publish appends its row in place.
+# It holds the only normalized copy of the embeddings, shared by search and the KB Improviser.
+vector_index = ShardedVectorIndex(
+    strategy=VECTOR_SHARDING,
+    num_shards=VECTOR_HASH_SHARDS,
+    workers=VECTOR_SEARCH_WORKERS,
+    parallel_min_rows=VECTOR_PARALLEL_MIN_ROWS
+)
+
+db_suggestions: Dict[str, KBImprovementSuggestion] = {}
+
 def save_draft(draft: KBDraft):
+    if draft.draft_id not in _draft_sequence:
+        _draft_sequence[draft.draft_id] = next(_draft_counter)
     db_drafts[draft.draft_id] = draft
 
 def get_draft(draft_id: str) -> Optional[KBDraft]:
@@ -20,6 +39,22 @@ def get_draft(draft_id: str) -> Optional[KBDraft]:
 def get_all_pending_drafts() -> List[KBDraft]:
     return [draft for draft in db_drafts.values() if draft.status == "pending_review"]
 
+def get_pending_drafts_page(offset: int = 0, limit: Optional[int] = None,
+                            after: Optional[str] = None) -> Tuple[List[KBDraft], int]:
+    """
+    Returns one page of pending drafts (insertion order, so new drafts land at the end) and the
+    total. `after` is a cursor: only drafts saved after that draft_id are paged, which unlike an
+    offset stays correct while other reviewers clear drafts from the queue. Raises KeyError
+    for an unknown cursor.
+    """
+    pending = get_all_pending_drafts()
+    total = len(pending)
+    if after is not None:
+        cursor = _draft_sequence[after]
+        pending = [draft for draft in pending if _draft_sequence[draft.draft_id] > cursor]
+    end = None if limit is None else offset + limit
+    return pending[offset:end], total
+
 def update_draft_status(draft_id: str, status: str, feedback: Optional[str] = None):
     if draft_id in db_drafts:
         db_drafts[draft_id].status = status
@@ -31,53 +66,91 @@ def update_draft_status(draft_id: str, status: str, feedback: Optional[str] = No
     return False
 
 def publish_kb_from_draft(draft_id: str, final_title: str, final_content: str, final_tags: List[str]) -> Optional[KBArticle]:
-    draft = get_draft(draft_id)
-    if not draft or draft.status != "pending_review":
-        return None
-
+    return publish_kbs_from_drafts([(draft_id, final_title, final_content, final_tags)])[0]
+
+def publish_kbs_from_drafts(items: List[Tuple[str, str, str, List[str]]]) -> List[Optional[KBArticle]]:
+    """
+    Publishes (draft_id, final_title, final_content, final_tags) items, embedding all the new
+    articles with one batch call. Returns the article per item, or None if its draft was not
+    found, not pending, or already published earlier in `items`.
+    """
     now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    published_kb = KBArticle(
-        title=final_title,
-        content_markdown=final_content,
-        tags=final_tags,
-        created_at=now_iso,
-        last_updated_at=now_iso,
-        source_draft_id=draft_id
-    )
-    db_published_kbs[published_kb.kb_id] = published_kb
+    articles: List[Optional[KBArticle]] = []
+    seen = set()
+    for draft_id, final_title, final_content, final_tags in items:
+        draft = get_draft(draft_id)
+        if not draft or draft.status != "pending_review" or draft_id in seen:
+            articles.append(None)
+            continue
+        seen.add(draft_id)
+        articles.append(KBArticle(
+            title=final_title,
+            content_markdown=final_content,
+            tags=final_tags,
+            created_at=now_iso,
+            last_updated_at=now_iso,
+            source_draft_id=draft_id
+        ))
 
+    to_publish = [article for article in articles if article is not None]
     # "Embed" and store in our mimic vector store
     # In RAG, you might chunk larger documents. Here we embed the whole content.
-    text_to_embed = f"Title: {published_kb.title}\nContent: {published_kb.content_markdown}"
-    embedding = get_embedding(text_to_embed)
-    vector_store_mimic[published_kb.kb_id] = (published_kb, embedding)
-
-    # Remove from drafts (or mark as published)
-    db_drafts.pop(draft_id, None)
-    print(f"KB Article {published_kb.kb_id} published from draft {draft_id}.")
-    return published_kb
+    embeddings = get_embeddings_batch([
+        f"Title: {article.title}\nContent: {article.content_markdown}" for article in to_publish
+    ])
+    for published_kb, embedding in zip(to_publish, embeddings):
+        db_published_kbs[published_kb.kb_id] = published_kb
+        vector_store_mimic[published_kb.kb_id] = (published_kb, embedding)
+        vector_index.add(published_kb.kb_id, published_kb.tags, embedding)
+        # Remove from drafts (or mark as published)
+        db_drafts.pop(published_kb.source_draft_id, None)
+        print(f"KB Article {published_kb.kb_id} published from draft {published_kb.source_draft_id}.")
+    return articles
 
 def get_published_kb(kb_id: str) -> Optional[KBArticle]:
     return db_published_kbs.get(kb_id)
 
-def search_vector_store(query_embedding: List[float], top_k: int) -> List[Tuple[KBArticle, float]]:
+def search_vector_store(query_embedding: List[float], top_k: int,
+                        shard_hints: Optional[List[str]] = None) -> List[Tuple[KBArticle, float]]:
+    """
+    Scatter-gather search over the sharded index. `shard_hints` (product tags) restrict
+    the search to those shards when sharding by tag; otherwise all shards are searched.
+    """
     if not vector_store_mimic:
         return []
 
-    scored_articles = []
-    for kb_id, (article_data, article_embedding) in vector_store_mimic.items():
-        if not article_embedding or not query_embedding: # Handle cases where embedding might have failed
-            similarity = 0.0
-        elif len(article_embedding) != len(query_embedding):
-            print(f"Warning: Embedding dimension mismatch for KB {kb_id}. Skipping.")
-            similarity = 0.0
-        else:
-            similarity = cosine_similarity(query_embedding, article_embedding)
-        scored_articles.append((article_data, similarity))
-
-    # Sort by similarity score in descending order
-    scored_articles.sort(key=lambda x: x[1], reverse=True)
-    return scored_articles[:top_k]
+    hits = vector_index.search(query_embedding, top_k, shard_hints)
+    return [(vector_store_mimic[kb_id][0], score) for kb_id, score in hits if kb_id in vector_store_mimic]
+
+def get_vector_shard_keys() -> List[str]:
+    return vector_index.shard_keys()
+
+def match_published_kbs(query_embeddings: List[List[float]]) -> List[Optional[Tuple[KBArticle, float]]]:
+    """
+    Returns, per query embedding, the best-matching published article and its cosine score
+    (None if nothing is indexed), scoring all queries against the index in one pass per shard.
+    """
+    return [
+        (vector_store_mimic[hit[0]][0], hit[1]) if hit is not None and hit[0] in vector_store_mimic else None
+        for hit in vector_index.best_matches(query_embeddings)
+    ]
+
+def save_suggestion(suggestion: KBImprovementSuggestion):
+    db_suggestions[suggestion.suggestion_id] = suggestion
+
+def get_suggestion(suggestion_id: str) -> Optional[KBImprovementSuggestion]:
+    return db_suggestions.get(suggestion_id)
+
+def get_all_pending_suggestions() -> List[KBImprovementSuggestion]:
+    return [s for s in db_suggestions.values() if s.status == "pending_review"]
+
+def update_suggestion_status(suggestion_id: str, status: str, feedback: Optional[str] = None) -> bool:
+    if suggestion_id in db_suggestions:
+        db_suggestions[suggestion_id].status = status
+        db_suggestions[suggestion_id].reviewer_feedback = feedback
+        print(f"Suggestion {suggestion_id} status updated to {status}. Feedback: {feedback or 'N/A'}")
+        return True
+    return False
 
 # Initialize with a dummy KB for testing retriever
 def init_dummy_data():
@@ -95,6 +168,7 @@ def init_dummy_data():
         text_to_embed = f"Title: {dummy_kb.title}\nContent: {dummy_kb.content_markdown}"
         embedding = get_embedding(text_to_embed)
         vector_store_mimic[dummy_kb.kb_id] = (dummy_kb, embedding)
+        vector_index.add(dummy_kb.kb_id, dummy_kb.tags, embedding)
         print("Dummy KB initialized for testing.")
 
 init_dummy_data()
\ No newline at end of file
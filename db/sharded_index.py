@@ -0,0 +1,361 @@
+# Sharded vector index with scatter-gather search.
+# The corpus is partitioned into shards (by the article's first tag, i.e. product line,
+# or by a hash of kb_id), each holding its own L2-normalized embedding matrix.
+# Queries fan out to the relevant shards and per-shard top-k results are merged.
+#
+# Shards grow in place: new rows are normalized and appended to a buffer with spare
+# capacity, so publishing an article costs O(dim) rather than a rebuild of the index.
+#
+# Large sharded indexes are searched on a long-lived local process pool ("spawn", so nothing
+# is forked from the threaded server). Once an index becomes eligible for the pool, its shard
+# buffers move into shared memory, which the workers attach to by name; a query only ships
+# the segment name, row count and query vector. Smaller or unsharded indexes never touch
+# shared memory. A segment replaced by a larger one is unlinked only once no search uses it.
+#
+# This module deliberately avoids importing the rest of the app so workers start cheaply.
+# Spawned workers also re-import the parent's main module when it was started as a script,
+# so the API must run as `uvicorn main:app` (`python main.py` re-executes itself that way).
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterable, List, Optional, Tuple
+import atexit
+import heapq
+import threading
+import zlib
+
+import numpy as np
+
+DEFAULT_SHARD = "default"
+UNTAGGED_SHARD = "untagged"
+MIN_SHARD_CAPACITY = 16
+
+# Worker-process state: shard key -> attached shared memory segment
+_worker_segments: Dict[str, SharedMemory] = {}
+
+
+def _attach_in_worker(shard_key: str, segment_name: str) -> SharedMemory:
+    segment = _worker_segments.get(shard_key)
+    if segment is None or segment.name != segment_name:
+        if segment is not None:
+            segment.close() # The shard outgrew this segment
+        segment = SharedMemory(name=segment_name)
+        _worker_segments[shard_key] = segment
+    return segment
+
+
+def _top_k(matrix: np.ndarray, query: np.ndarray, top_k: int) -> Tuple[List[int], List[float]]:
+    if matrix.shape[0] == 0 or top_k <= 0:
+        return [], []
+    scores = matrix @ query
+    k = min(top_k, scores.shape[0])
+    # argpartition is O(n); only the k winners get sorted
+    rows = np.argpartition(-scores, k - 1)[:k]
+    rows = rows[np.argsort(-scores[rows])]
+    return rows.tolist(), scores[rows].tolist()
+
+
+def _search_shard_in_worker(shard_key: str, segment_name: str, rows: int, dim: int,
+                            query: np.ndarray, top_k: int) -> Tuple[str, List[int], List[float]]:
+    segment = _attach_in_worker(shard_key, segment_name)
+    matrix = np.ndarray((rows, dim), dtype=np.float32, buffer=segment.buf)
+    return (shard_key, *_top_k(matrix, query, top_k))
+
+
+def shard_key_for(kb_id: str, tags: List[str], strategy: str, num_shards: int) -> str:
+    if strategy == "tag":
+        return tags[0].strip().lower() if tags else UNTAGGED_SHARD
+    if strategy == "hash":
+        return f"hash-{zlib.crc32(kb_id.encode('utf-8')) % max(1, num_shards)}"
+    return DEFAULT_SHARD
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class _Segment:
+    """A shared memory block plus the number of searches currently reading it."""
+    __slots__ = ("shm", "refs", "retired")
+
+    def __init__(self, shm: SharedMemory):
+        self.shm = shm
+        self.refs = 0
+        self.retired = False
+
+
+class _Shard:
+    """Row buffer with spare capacity; `matrix` is the filled, normalized part."""
+    __slots__ = ("ids", "rows", "buffer", "segment")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.rows = 0
+        self.buffer: Optional[np.ndarray] = None
+        self.segment: Optional[_Segment] = None # Set once the buffer lives in shared memory
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.buffer[:self.rows]
+
+
+def _best_in_shard(query_matrix: np.ndarray, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    scores = query_matrix @ matrix.T # (n_queries, n_shard_rows)
+    rows = scores.argmax(axis=1)
+    return rows, scores[np.arange(len(rows)), rows]
+
+
+class ShardedVectorIndex:
+    """
+    strategy: "none" (single shard), "tag" (first tag of each article) or "hash" (kb_id hash).
+    Searches run on `workers` processes once a sharded index holds at least `parallel_min_rows`
+    vectors; smaller indexes are cheaper to search in-process.
+    """
+
+    def __init__(self, strategy: str = "none", num_shards: int = 1, workers: int = 1,
+                 parallel_min_rows: int = 50000):
+        self.strategy = strategy if strategy in ("none", "tag", "hash") else "none"
+        if self.strategy != strategy:
+            print(f"Warning: Unknown sharding strategy '{strategy}'. Using a single shard.")
+        self.num_shards = max(1, num_shards)
+        self.workers = max(1, workers)
+        self.parallel_min_rows = parallel_min_rows
+        self.dim: Optional[int] = None
+        self.shards: Dict[str, _Shard] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # True once the shard buffers have moved into shared memory for the worker pool
+        self._sharing = False
+        # Unlinked segments whose local mapping could not be closed yet (a stray view remained)
+        self._unclosed: List[SharedMemory] = []
+        # Guards shard layout and segment reference counts; never held while searching
+        self._lock = threading.RLock()
+        atexit.register(self.close)
+
+    def add(self, kb_id: str, tags: List[str], embedding: List[float]) -> bool:
+        """Appends one article to its shard. Returns False if the embedding was rejected."""
+        if not embedding:
+            return False
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(embedding)
+            elif len(embedding) != self.dim:
+                print(f"Warning: Embedding dimension mismatch for KB {kb_id}. Excluding it from the index.")
+                return False
+            key = shard_key_for(kb_id, tags, self.strategy, self.num_shards)
+            row = _normalize_rows(np.asarray([embedding], dtype=np.float32))
+            self._append(key, [kb_id], row)
+        return True
+
+    def build(self, entries: Iterable[Tuple[str, List[str], List[float]]]):
+        """(Re)builds all shards from (kb_id, tags, embedding) entries."""
+        with self._lock:
+            self._release_shards()
+            self.dim = None
+            shard_rows: Dict[str, List[List[float]]] = {}
+            shard_ids: Dict[str, List[str]] = {}
+            for kb_id, tags, embedding in entries:
+                if not embedding:
+                    continue
+                if self.dim is None:
+                    self.dim = len(embedding)
+                elif len(embedding) != self.dim:
+                    print(f"Warning: Embedding dimension mismatch for KB {kb_id}. Excluding it from the index.")
+                    continue
+                key = shard_key_for(kb_id, tags, self.strategy, self.num_shards)
+                shard_rows.setdefault(key, []).append(embedding)
+                shard_ids.setdefault(key, []).append(kb_id)
+            for key, rows in shard_rows.items():
+                self._append(key, shard_ids[key], _normalize_rows(np.asarray(rows, dtype=np.float32)))
+
+    def _pool_eligible(self) -> bool:
+        return (self.strategy != "none" and self.workers > 1 and len(self.shards) > 1
+                and self.total_rows() >= self.parallel_min_rows)
+
+    def _allocate(self, capacity: int) -> Tuple[np.ndarray, Optional[_Segment]]:
+        shape = (capacity, self.dim)
+        if not self._sharing:
+            return np.empty(shape, dtype=np.float32), None
+        segment = _Segment(SharedMemory(create=True, size=max(1, capacity * self.dim * 4)))
+        return np.ndarray(shape, dtype=np.float32, buffer=segment.shm.buf), segment
+
+    def _replace_buffer(self, shard: _Shard, capacity: int):
+        buffer, segment = self._allocate(capacity)
+        if shard.rows:
+            buffer[:shard.rows] = shard.matrix
+        old_segment = shard.segment
+        shard.buffer, shard.segment = buffer, segment
+        if old_segment is not None:
+            self._retire(old_segment)
+
+    def _append(self, key: str, kb_ids: List[str], rows: np.ndarray):
+        shard = self.shards.setdefault(key, _Shard())
+        needed = shard.rows + rows.shape[0]
+        capacity = 0 if shard.buffer is None else shard.buffer.shape[0]
+        if needed > capacity:
+            # Doubling keeps appends amortized O(dim)
+            self._replace_buffer(shard, max(MIN_SHARD_CAPACITY, needed, capacity * 2))
+        shard.buffer[shard.rows:needed] = rows
+        shard.ids.extend(kb_ids)
+        shard.rows = needed # Publish the rows only once they are written
+        if not self._sharing and self._pool_eligible():
+            # Crossing parallel_min_rows: move every shard into shared memory for the workers
+            self._sharing = True
+            for other in self.shards.values():
+                self._replace_buffer(other, other.buffer.shape[0])
+
+    def _retire(self, segment: _Segment):
+        segment.retired = True
+        self._finalize(segment)
+
+    def _finalize(self, segment: _Segment):
+        if not segment.retired or segment.refs > 0:
+            return
+        segment.shm.unlink()
+        self._unclosed.append(segment.shm)
+        still_viewed = []
+        for shm in self._unclosed:
+            try:
+                shm.close()
+            except BufferError: # Some array still views it; retried on the next retirement
+                still_viewed.append(shm)
+        self._unclosed = still_viewed
+
+    def _acquire(self, shard_keys: List[str]) -> List[Tuple[str, np.ndarray, List[str], Optional[_Segment]]]:
+        """
+        Snapshots (key, matrix view, ids, segment) under the lock and pins the segments, so
+        searches can run unlocked while shards grow. Rows appended later are not searched;
+        ids only ever grow, so the list itself can be shared.
+        """
+        acquired = []
+        for key in shard_keys:
+            shard = self.shards[key]
+            if shard.segment is not None:
+                shard.segment.refs += 1
+            acquired.append((key, shard.matrix, shard.ids, shard.segment))
+        return acquired
+
+    def _release(self, segments: List[Optional[_Segment]]):
+        with self._lock:
+            for segment in segments:
+                if segment is not None:
+                    segment.refs -= 1
+                    self._finalize(segment)
+
+    def total_rows(self) -> int:
+        return sum(shard.rows for shard in self.shards.values())
+
+    def shard_keys(self) -> List[str]:
+        return sorted(self.shards)
+
+    def _route(self, shard_hints: Optional[List[str]]) -> List[str]:
+        if not shard_hints:
+            return list(self.shards)
+        if self.strategy != "tag":
+            # Hash/single-shard layouts don't align with products; hints can't narrow the search
+            return list(self.shards)
+        requested = {hint.strip().lower() for hint in shard_hints if hint.strip()}
+        return [key for key in self.shards if key in requested]
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context("spawn") # Forking a multithreaded server is unsafe
+            )
+        return self._pool
+
+    def search(self, query_embedding: List[float], top_k: int,
+               shard_hints: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """Returns the merged top_k (kb_id, cosine score) across the routed shards."""
+        if not self.shards or not query_embedding or top_k <= 0:
+            return []
+        if len(query_embedding) != self.dim:
+            print(f"Warning: Query embedding dimension {len(query_embedding)} does not match index dimension {self.dim}.")
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+
+        with self._lock:
+            acquired = self._acquire(self._route(shard_hints))
+            pool = self._get_pool() if self._sharing and len(acquired) > 1 else None
+            dim = self.dim
+        segments = [segment for _key, _matrix, _ids, segment in acquired]
+        ids_by_key = {key: ids for key, _matrix, ids, _segment in acquired}
+        try:
+            if pool is not None:
+                futures = [
+                    pool.submit(_search_shard_in_worker, key, segment.shm.name, matrix.shape[0], dim, query, top_k)
+                    for key, matrix, _ids, segment in acquired
+                ]
+                del acquired # Drop the local views; the pinned segments stay mapped for the workers
+                shard_results = [future.result() for future in futures]
+            else:
+                shard_results = [(key, *_top_k(matrix, query, top_k)) for key, matrix, _ids, _segment in acquired]
+                del acquired
+        finally:
+            self._release(segments)
+
+        merged = (
+            (ids_by_key[key][row], score)
+            for key, rows, scores in shard_results
+            for row, score in zip(rows, scores)
+        )
+        return heapq.nlargest(top_k, merged, key=lambda hit: hit[1])
+
+    def best_matches(self, query_embeddings: List[List[float]]) -> List[Optional[Tuple[str, float]]]:
+        """
+        Scores many queries against every shard (one matmul per shard) and returns, per query,
+        (kb_id of the best row, cosine score), or None if the index is empty or dimensions differ.
+        """
+        if not query_embeddings:
+            return []
+        query_matrix = np.asarray(query_embeddings, dtype=np.float32)
+        with self._lock:
+            acquired = self._acquire([key for key, shard in self.shards.items() if shard.rows])
+            dim = self.dim
+        segments = [segment for _key, _matrix, _ids, segment in acquired]
+        try:
+            if not acquired:
+                return [None] * len(query_embeddings)
+            if query_matrix.ndim != 2 or query_matrix.shape[1] != dim:
+                print(f"Warning: Query embedding shape {query_matrix.shape} does not match index dimension {dim}. No matches.")
+                return [None] * len(query_embeddings)
+
+            query_matrix = _normalize_rows(query_matrix)
+            best_scores = np.full(query_matrix.shape[0], -np.inf, dtype=np.float32)
+            best_ids: List[Optional[str]] = [None] * query_matrix.shape[0]
+            while acquired:
+                _key, matrix, ids, _segment = acquired.pop()
+                rows, shard_best = _best_in_shard(query_matrix, matrix)
+                del matrix
+                for i in np.nonzero(shard_best > best_scores)[0]:
+                    best_scores[i] = shard_best[i]
+                    best_ids[i] = ids[rows[i]]
+        finally:
+            del acquired
+            self._release(segments)
+        return [
+            (kb_id, float(score)) if kb_id is not None else None
+            for kb_id, score in zip(best_ids, best_scores)
+        ]
+
+    def _release_shards(self):
+        shards, self.shards = self.shards, {}
+        self._sharing = False
+        for shard in shards.values():
+            segment, shard.buffer, shard.segment = shard.segment, None, None
+            if segment is not None:
+                self._retire(segment)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        with self._lock:
+            self._release_shards()
@@ -1,48 +1,133 @@
-from fastapi import FastAPI, HTTPException, Body
+if __name__ == "__main__":
+    import os
+    import sys
+    # Re-run under uvicorn's entry point before building the app: vector search workers are
+    # spawned processes, which re-execute a script __main__ (app, dummy data, embedding
+    # clients) but skip a package __main__ such as uvicorn's.
+    os.execv(sys.executable, [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--app-dir", os.path.dirname(os.path.abspath(__file__)),
+        "--host", "0.0.0.0", "--port", "8000"
+    ])
+
+from fastapi import FastAPI, HTTPException, Body, Depends, Header, Query, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional, Set, Type
 from typing import List
 from models.schemas import (
     TicketDataInput, KBDraft, KBArticle,
-    KBSearchQuery, KBSearchResponse
+    KBSearchQuery, KBSearchResultItem, KBSearchProjectedResponse,
+    KBImprovementSuggestion, KBImprovementRequest
 )
 from agents.kb_creator_agent import create_kb_draft_from_ticket
 from agents.kb_retriever_agent import search_knowledge_base
+from agents.kb_improviser_agent import suggest_kb_improvements, suggest_improvements_from_tickets
 from db.in_memory_db import (
-    get_all_pending_drafts, get_draft, update_draft_status,
-    publish_kb_from_draft, get_published_kb
+    get_pending_drafts_page, get_draft, update_draft_status,
+    publish_kb_from_draft, publish_kbs_from_drafts, get_published_kb,
+    get_all_pending_suggestions, get_suggestion, update_suggestion_status,
+    get_vector_shard_keys
 )
+from core.config import RESPONSE_GZIP_MIN_BYTES, ADMIN_API_KEY
+from core.profiling import ProfilingMiddleware, sampling_profiler, slow_request_recorder
+import fastapi
+import secrets
 import datetime
+import re
+
+try:
+    import orjson
+except ImportError: # Optional: fall back to the stdlib JSON encoder
+    orjson = None
+
+if orjson is not None:
+    class FastJSONResponse(JSONResponse):
+        """JSONResponse rendered with orjson, for responses the endpoints build themselves."""
+        def render(self, content) -> bytes:
+            return orjson.dumps(content)
+else:
+    FastJSONResponse = JSONResponse
 
-app = FastAPI(title="AI-Powered KB Workflow API")
+# FastAPI 0.130+ serializes response_model output straight to JSON bytes through Pydantic,
+# but only with its default response class (and deprecates ORJSONResponse from 0.131).
+# Older versions still encode via jsonable_encoder + json.dumps, where orjson helps.
+_fastapi_version = tuple(int(part) for part in re.findall(r"\d+", fastapi.__version__)[:2])
+_DEFAULT_RESPONSE_CLASS = JSONResponse if _fastapi_version >= (0, 130) else FastJSONResponse
+
+app = FastAPI(title="AI-Powered KB Workflow API", default_response_class=_DEFAULT_RESPONSE_CLASS)
+app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_GZIP_MIN_BYTES)
+app.add_middleware(ProfilingMiddleware) # Outermost, so traces include compression time
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Set[str]]:
+    """
+    Parses a comma-separated `fields` query param (e.g. "kb_id,title,score") into a
+    projection set for `model`. Returns None when no projection was requested.
+    """
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields for {model.__name__}: {', '.join(sorted(unknown))}")
+    return requested
 
 @app.post("/api/v1/kb/drafts/from_ticket", response_model=KBDraft, status_code=201)
-async def create_draft_endpoint(ticket_data: TicketDataInput):
+async def create_draft_endpoint(ticket_data: TicketDataInput, fields: Optional[str] = None):
     """
     Creates a KB draft from resolved ticket data.
+    Use fields=draft_id,generated_title to receive only selected draft fields.
     """
+    draft_fields = parse_fields(fields, KBDraft)
     try:
         draft = create_kb_draft_from_ticket(ticket_data)
-        return draft
     except Exception as e:
         print(f"Error creating draft: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create draft: {str(e)}")
+    if draft_fields:
+        # Returning a response directly skips a second response_model validation pass
+        return FastJSONResponse(draft.model_dump(include=draft_fields), status_code=201)
+    return draft
 
 @app.get("/api/v1/kb/drafts/pending", response_model=List[KBDraft])
-async def list_pending_drafts_endpoint():
+async def list_pending_drafts_endpoint(
+    response: Response,
+    fields: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None
+):
     """
-    Lists all KB drafts pending review.
+    Lists KB drafts pending review, oldest first.
+    Use fields=draft_id,generated_title to list drafts without their full content, and
+    after=<last draft_id seen>&limit=N to page through the queue (offset also works, but skips
+    drafts when others are reviewed meanwhile). The full queue size is in the X-Total-Count header.
     """
-    return get_all_pending_drafts()
+    draft_fields = parse_fields(fields, KBDraft)
+    try:
+        drafts, total = get_pending_drafts_page(offset, limit, after)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown draft cursor: {after}")
+    if draft_fields:
+        return FastJSONResponse(
+            [draft.model_dump(include=draft_fields) for draft in drafts],
+            headers={"X-Total-Count": str(total)}
+        )
+    response.headers["X-Total-Count"] = str(total)
+    return drafts
 
 @app.get("/api/v1/kb/drafts/{draft_id}", response_model=KBDraft)
-async def get_draft_endpoint(draft_id: str):
+async def get_draft_endpoint(draft_id: str, fields: Optional[str] = None):
     """
     Retrieves a specific KB draft by ID.
     """
+    draft_fields = parse_fields(fields, KBDraft)
     draft = get_draft(draft_id)
     if not draft:
         raise HTTPException(status_code=404, detail="Draft not found")
+    if draft_fields:
+        return FastJSONResponse(draft.model_dump(include=draft_fields))
     return draft
 
 class ApproveRejectPayload(BaseModel):
@@ -83,13 +168,77 @@ async def reject_draft_endpoint(draft_id: str, payload: ApproveRejectPayload = B
         raise HTTPException(status_code=404, detail="Draft not found")
     return {"message": "Draft rejected successfully", "draft_id": draft_id}
 
-@app.post("/api/v1/kb/search", response_model=KBSearchResponse)
-async def search_kb_endpoint(search_payload: KBSearchQuery, synthesize_answer: bool = False):
+class BatchReviewPayload(BaseModel):
+    action: Literal["approve", "reject"]
+    draft_ids: List[str]
+    feedback: Optional[str] = None # For rejections
+
+class BatchReviewItemResult(BaseModel):
+    draft_id: str
+    success: bool
+    kb_id: Optional[str] = None # Set for approved drafts
+    error: Optional[str] = None
+
+class BatchReviewResponse(BaseModel):
+    results: List[BatchReviewItemResult]
+
+@app.post("/api/v1/kb/drafts/batch_review", response_model=BatchReviewResponse)
+async def batch_review_drafts_endpoint(payload: BatchReviewPayload):
+    """
+    Approves or rejects several pending drafts in one call.
+    Approved drafts are published with their generated title, content and suggested tags.
+    Each draft gets its own result; one failure does not abort the batch.
+    """
+    results = {}
+    to_publish = []
+    for draft_id in dict.fromkeys(payload.draft_ids): # De-duplicate, keep order
+        draft = get_draft(draft_id)
+        if not draft or draft.status != "pending_review":
+            results[draft_id] = BatchReviewItemResult(draft_id=draft_id, success=False, error="Draft not found or already processed")
+        elif payload.action == "approve":
+            results[draft_id] = None # Filled in once the batch is published
+            to_publish.append((draft_id, draft.generated_title, draft.generated_content_markdown, draft.suggested_tags))
+        else:
+            update_draft_status(draft_id, "rejected", payload.feedback)
+            results[draft_id] = BatchReviewItemResult(draft_id=draft_id, success=True)
+
+    # One embedding call for all approved drafts
+    for (draft_id, *_), published_kb in zip(to_publish, publish_kbs_from_drafts(to_publish)):
+        if published_kb:
+            results[draft_id] = BatchReviewItemResult(draft_id=draft_id, success=True, kb_id=published_kb.kb_id)
+        else:
+            results[draft_id] = BatchReviewItemResult(draft_id=draft_id, success=False, error="Failed to publish draft")
+    return BatchReviewResponse(results=list(results.values()))
+
+@app.post("/api/v1/kb/search", response_model=KBSearchProjectedResponse, response_model_exclude_unset=True)
+async def search_kb_endpoint(
+    search_payload: KBSearchQuery,
+    synthesize_answer: bool = False,
+    fields: Optional[str] = None,
+    include_full_content: bool = False
+):
     """
     Searches the knowledge base using natural language.
     Set synthesize_answer=true query param to get a RAG-style answer.
+    Use fields=kb_id,title,score to project result items, and include_full_content=true
+    (or full_content_markdown in fields) to receive full article bodies.
+    """
+    item_fields = parse_fields(fields, KBSearchResultItem)
+    # Items are built once, already projected; only fields passed explicitly count as set,
+    # so response_model_exclude_unset leaves the others out of the response
+    return search_knowledge_base(
+        search_payload,
+        synthesize_answer=synthesize_answer,
+        include_full_content=include_full_content,
+        fields=item_fields
+    )
+
+@app.get("/api/v1/kb/shards", response_model=List[str])
+async def list_shards_endpoint():
+    """
+    Lists the vector index shard keys usable as `shards` routing hints in search queries.
     """
-    return search_knowledge_base(search_payload, synthesize_answer=synthesize_answer)
+    return get_vector_shard_keys()
 
 @app.get("/api/v1/kb/published/{kb_id}", response_model=KBArticle)
 async def get_published_kb_endpoint(kb_id: str):
@@ -102,15 +251,117 @@ async def get_published_kb_endpoint(kb_id: str):
     return kb
 
 
-# --- Placeholder for KB Improviser Endpoints ---
-# @app.post("/api/v1/kb/{kb_id}/suggestions")
-# async def suggest_improvements_endpoint(kb_id: str, new_info: str = Body(..., embed=True)):
-#     # Call kb_improviser_agent.suggest_kb_improvements(kb_id, new_info)
-#     return {"message": "Improvement suggestion process initiated (placeholder)."}
+# --- KB Improviser Endpoints ---
+@app.post("/api/v1/kb/suggestions/from_tickets", response_model=List[KBImprovementSuggestion], status_code=201)
+async def suggest_from_tickets_endpoint(tickets: List[TicketDataInput]):
+    """
+    Matches a batch of newly resolved tickets against published KBs and stores
+    one improvement suggestion per matched KB.
+    """
+    try:
+        return suggest_improvements_from_tickets(tickets)
+    except Exception as e:
+        print(f"Error generating suggestions from tickets: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate suggestions: {str(e)}")
 
-if __name__ == "__main__":
-    import uvicorn
-    # Initialize dummy data if needed (already called in in_memory_db.py)
-    # from db.in_memory_db import init_dummy_data
-    # init_dummy_data()
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+@app.post("/api/v1/kb/{kb_id}/suggestions", response_model=KBImprovementSuggestion, status_code=201)
+async def suggest_improvements_endpoint(kb_id: str, payload: KBImprovementRequest):
+    """
+    Suggests improvements to a published KB based on new information.
+    """
+    if not get_published_kb(kb_id):
+        raise HTTPException(status_code=404, detail="Published KB not found")
+    suggestion = suggest_kb_improvements(kb_id, payload.new_information, payload.source_info or "Manual submission")
+    if not suggestion:
+        raise HTTPException(status_code=502, detail="LLM failed to generate a suggestion")
+    return suggestion
+
+@app.get("/api/v1/kb/suggestions", response_model=List[KBImprovementSuggestion])
+async def list_pending_suggestions_endpoint():
+    """
+    Lists all KB improvement suggestions pending review.
+    """
+    return get_all_pending_suggestions()
+
+@app.get("/api/v1/kb/suggestions/{suggestion_id}", response_model=KBImprovementSuggestion)
+async def get_suggestion_endpoint(suggestion_id: str):
+    """
+    Retrieves a specific improvement suggestion by ID.
+    """
+    suggestion = get_suggestion(suggestion_id)
+    if not suggestion:
+        raise HTTPException(status_code=404, detail="Suggestion not found")
+    return suggestion
+
+@app.put("/api/v1/kb/suggestions/{suggestion_id}/reject")
+async def reject_suggestion_endpoint(suggestion_id: str, payload: ApproveRejectPayload = Body(...)):
+    """
+    Rejects an improvement suggestion.
+    """
+    success = update_suggestion_status(suggestion_id, "rejected", payload.feedback)
+    if not success:
+        raise HTTPException(status_code=404, detail="Suggestion not found")
+    return {"message": "Suggestion rejected successfully", "suggestion_id": suggestion_id}
+
+# --- Admin Diagnostics Endpoints ---
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_API_KEY not set)")
+    if not x_admin_key or not secrets.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+class ProfilerStartPayload(BaseModel):
+    duration_seconds: float = 30.0
+    interval_ms: float = 10.0
+
+class SlowRequestConfigPayload(BaseModel):
+    enabled: Optional[bool] = None
+    threshold_ms: Optional[float] = None
+
+@app.post("/api/v1/admin/profiler/start", dependencies=[Depends(require_admin)])
+async def start_profiler_endpoint(payload: Optional[ProfilerStartPayload] = None):
+    """
+    Starts sampling stacks of in-flight requests for a bounded window.
+    """
+    payload = payload or ProfilerStartPayload()
+    if not sampling_profiler.start(payload.duration_seconds, payload.interval_ms):
+        raise HTTPException(status_code=409, detail="Profiler is already running")
+    return sampling_profiler.status()
+
+@app.post("/api/v1/admin/profiler/stop", dependencies=[Depends(require_admin)])
+async def stop_profiler_endpoint():
+    sampling_profiler.stop()
+    return sampling_profiler.status()
+
+@app.get("/api/v1/admin/profiler/status", dependencies=[Depends(require_admin)])
+async def profiler_status_endpoint():
+    return sampling_profiler.status()
+
+@app.get("/api/v1/admin/profiler/collapsed", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profiler_collapsed_stacks_endpoint():
+    """
+    Returns the samples of the current or last profiling window in collapsed-stack format,
+    ready for flamegraph.pl, speedscope or inferno.
+    """
+    return sampling_profiler.collapsed_stacks()
+
+@app.get("/api/v1/admin/slow_requests", dependencies=[Depends(require_admin)])
+async def list_slow_requests_endpoint():
+    """
+    Returns the captured per-stage timing traces of requests slower than the threshold.
+    """
+    return {
+        "enabled": slow_request_recorder.enabled,
+        "threshold_ms": slow_request_recorder.threshold_ms,
+        "traces": slow_request_recorder.snapshot()
+    }
+
+@app.put("/api/v1/admin/slow_requests/config", dependencies=[Depends(require_admin)])
+async def configure_slow_requests_endpoint(payload: SlowRequestConfigPayload):
+    slow_request_recorder.configure(payload.enabled, payload.threshold_ms)
+    return {"enabled": slow_request_recorder.enabled, "threshold_ms": slow_request_recorder.threshold_ms}
+
+@app.delete("/api/v1/admin/slow_requests", dependencies=[Depends(require_admin)])
+async def clear_slow_requests_endpoint():
+    slow_request_recorder.clear()
+    return {"message": "Slow request buffer cleared"}
@@ -10,6 +10,13 @@ class TicketDataInput(BaseModel):
     conversation_log: Optional[str] = Field(None, description="Agent-customer conversation log")
     tags: Optional[List[str]] = Field(default_factory=list, description="Original ticket tags")
 
+class LogCondensationReport(BaseModel):
+    original_tokens: int
+    stripped_tokens: int # After deterministic boilerplate removal
+    final_tokens: int # What was actually sent to the draft generation prompt
+    segments: int = 0 # Number of segments condensed by the LLM (0 if none were needed)
+    tokens_saved: int
+
 class KBDraft(BaseModel):
     draft_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     source_ticket_id: str
@@ -22,6 +29,7 @@ class KBDraft(BaseModel):
     problem_description: Optional[str] = None
     cause: Optional[str] = None
     resolution_steps: Optional[str] = None
+    log_condensation: Optional[LogCondensationReport] = None
 
 
 class KBArticle(BaseModel):
@@ -38,6 +46,10 @@ class KBArticle(BaseModel):
 class KBSearchQuery(BaseModel):
     query: str
     top_k: int = 3
+    # Token budget for the RAG context; falls back to RAG_CONTEXT_TOKEN_BUDGET when unset
+    context_token_budget: Optional[int] = Field(None, gt=0)
+    # Routing hints: product tags whose shards should be searched (all shards when unset)
+    shards: Optional[List[str]] = None
 
 class KBSearchResultItem(BaseModel):
     kb_id: str
@@ -46,7 +58,42 @@ class KBSearchResultItem(BaseModel):
     score: float
     full_content_markdown: Optional[str] = None # Optionally return full content
 
+class LLMUsage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    context_tokens: int = 0 # Portion of prompt_tokens spent on retrieved KB excerpts
+    context_token_budget: int = 0
+
 class KBSearchResponse(BaseModel):
     results: List[KBSearchResultItem]
     # Optional synthesized answer from RAG
-    synthesized_answer: Optional[str] = None
\ No newline at end of file
+    synthesized_answer: Optional[str] = None
+    usage: Optional[LLMUsage] = None # Only set when an answer was synthesized
+
+class KBSearchResultItemProjection(BaseModel):
+    # KBSearchResultItem as returned by /kb/search: only the fields selected with `fields=`
+    # are present, and full_content_markdown only when full content was requested
+    kb_id: Optional[str] = None
+    title: Optional[str] = None
+    content_snippet: Optional[str] = None
+    score: Optional[float] = None
+    full_content_markdown: Optional[str] = None
+
+class KBSearchProjectedResponse(BaseModel):
+    results: List[KBSearchResultItemProjection]
+    synthesized_answer: Optional[str] = None
+    usage: Optional[LLMUsage] = None
+
+class KBImprovementSuggestion(BaseModel):
+    suggestion_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    kb_id: str
+    source_info: str # e.g. "User feedback", "Tickets: T-1, T-2"
+    suggested_changes: str # Markdown list of concrete edits proposed by the LLM
+    reasoning: Optional[str] = None
+    status: str = "pending_review" # pending_review, approved, rejected
+    created_at: str # ISO format string
+    reviewer_feedback: Optional[str] = None
+
+class KBImprovementRequest(BaseModel):
+    new_information: str = Field(..., description="Feedback text or summary of a related resolved ticket")
+    source_info: Optional[str] = Field(None, description="Where the new information came from")
@@ -0,0 +1,9 @@
+# Runs before any test module imports the app: core.config reads the environment at import
+# time and load_dotenv never overrides variables that are already set.
+import os
+
+# The local hashing embedder is the provider for tests and benchmarks (no network, no model download)
+os.environ["EMBEDDING_PROVIDER_DEFAULT"] = "hashing"
+# Keep placeholder keys from a local .env from building LLM clients; LLM calls are mocked or patched
+os.environ["OPENAI_API_KEY"] = ""
+os.environ["OPENROUTER_API_KEY"] = ""
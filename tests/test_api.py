@@ -0,0 +1,157 @@
+import warnings
+
+from fastapi.testclient import TestClient
+
+import pytest
+
+import main
+from models.schemas import KBArticle
+
+client = TestClient(main.app)
+
+
+@pytest.fixture
+def fixed_search(monkeypatch):
+    """Vector search returning one fixed article, so the retriever's own projection is exercised."""
+    from agents import kb_retriever_agent
+
+    article = KBArticle(kb_id="kb-1", title="Reset password", content_markdown="Go to login" * 20,
+                        created_at="2025-01-01T00:00:00", last_updated_at="2025-01-01T00:00:00")
+    monkeypatch.setattr(kb_retriever_agent, "search_vector_store", lambda embedding, top_k, shards: [(article, 0.9)])
+
+
+def test_search_projects_result_fields(fixed_search):
+    response = client.post("/api/v1/kb/search?fields=kb_id,score", json={"query": "reset my password"})
+    assert response.status_code == 200
+    assert response.json() == {"results": [{"kb_id": "kb-1", "score": 0.9}], "synthesized_answer": None, "usage": None}
+
+
+def test_search_omits_full_content_unless_requested(fixed_search):
+    item = client.post("/api/v1/kb/search", json={"query": "reset my password"}).json()["results"][0]
+    assert set(item) == {"kb_id", "title", "content_snippet", "score"}
+    assert item["content_snippet"] == ("Go to login" * 20)[:200] + "..."
+    item = client.post("/api/v1/kb/search?include_full_content=true", json={"query": "reset my password"}).json()["results"][0]
+    assert item["full_content_markdown"] == "Go to login" * 20
+    item = client.post("/api/v1/kb/search?fields=kb_id,full_content_markdown", json={"query": "reset my password"}).json()["results"][0]
+    assert item == {"kb_id": "kb-1", "full_content_markdown": "Go to login" * 20}
+
+
+def test_search_builds_each_item_once(fixed_search, monkeypatch):
+    from agents import kb_retriever_agent
+    from models.schemas import KBSearchResultItemProjection
+
+    calls = []
+
+    def counting_projection(**values):
+        calls.append(values)
+        return KBSearchResultItemProjection(**values)
+
+    monkeypatch.setattr(kb_retriever_agent, "KBSearchResultItemProjection", counting_projection)
+    response = client.post("/api/v1/kb/search?fields=title", json={"query": "reset my password"})
+    assert response.json()["results"] == [{"title": "Reset password"}]
+    assert calls == [{"title": "Reset password"}]
+
+
+def test_search_schema_allows_projected_items():
+    schema = client.get("/openapi.json").json()["components"]["schemas"]["KBSearchResultItemProjection"]
+    assert not schema.get("required")
+
+
+def test_responses_use_no_deprecated_response_class():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert client.get("/api/v1/kb/drafts/pending?fields=draft_id").status_code == 200
+        assert client.get("/api/v1/kb/shards").status_code == 200
+
+
+@pytest.fixture
+def draft_queue(monkeypatch):
+    """An empty draft queue plus a factory for pending drafts saved in order."""
+    from db import in_memory_db
+    from models.schemas import KBDraft
+
+    monkeypatch.setattr(in_memory_db, "db_drafts", {})
+
+    def make(count):
+        drafts = []
+        for i in range(count):
+            draft = KBDraft(source_ticket_id=f"T{i}", generated_title=f"Draft {i}",
+                            generated_content_markdown=f"## Resolution Steps\nStep {i}",
+                            suggested_tags=["vpn"], created_at="2025-01-01T00:00:00")
+            in_memory_db.save_draft(draft)
+            drafts.append(draft.draft_id)
+        return drafts
+    return make
+
+
+def _pending_ids(**params):
+    response = client.get("/api/v1/kb/drafts/pending", params={"fields": "draft_id", **params})
+    assert response.status_code == 200
+    return [d["draft_id"] for d in response.json()], int(response.headers["X-Total-Count"])
+
+
+def test_pending_drafts_offset_and_limit_pages(draft_queue):
+    ids = draft_queue(5)
+    assert _pending_ids(limit=2) == (ids[:2], 5)
+    assert _pending_ids(offset=2, limit=2) == (ids[2:4], 5)
+    assert _pending_ids(offset=4, limit=2) == (ids[4:], 5)
+    assert _pending_ids(offset=5, limit=2) == ([], 5)
+    assert _pending_ids() == (ids, 5)
+
+
+def test_pending_drafts_cursor_survives_concurrent_review(draft_queue):
+    ids = draft_queue(6)
+    first_page, _ = _pending_ids(limit=3)
+    assert first_page == ids[:3]
+    # Another reviewer clears two drafts from the first page and the last loaded one is published
+    client.put(f"/api/v1/kb/drafts/{ids[0]}/reject", json={})
+    client.put(f"/api/v1/kb/drafts/{ids[1]}/reject", json={})
+    client.post("/api/v1/kb/drafts/batch_review", json={"action": "approve", "draft_ids": [ids[2]]})
+    assert _pending_ids(after=ids[2], limit=3) == (ids[3:], 3)
+    assert _pending_ids(after=ids[5], limit=3) == ([], 3)
+
+
+def test_pending_drafts_unknown_cursor_is_rejected(draft_queue):
+    draft_queue(1)
+    assert client.get("/api/v1/kb/drafts/pending", params={"after": "no-such-draft"}).status_code == 400
+
+
+def test_batch_approve_publishes_with_one_embedding_call(draft_queue, monkeypatch):
+    from db import in_memory_db
+
+    ids = draft_queue(3)
+    calls = []
+    real_batch = in_memory_db.get_embeddings_batch
+
+    def counting_batch(texts):
+        calls.append(len(texts))
+        return real_batch(texts)
+
+    monkeypatch.setattr(in_memory_db, "get_embeddings_batch", counting_batch)
+    response = client.post("/api/v1/kb/drafts/batch_review", json={"action": "approve", "draft_ids": ids + [ids[0]]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["draft_id"] for r in results] == ids # Duplicates collapsed, order kept
+    assert all(r["success"] and r["kb_id"] for r in results)
+    assert calls == [3]
+    for result in results:
+        assert client.get(f"/api/v1/kb/published/{result['kb_id']}").status_code == 200
+    assert _pending_ids() == ([], 0)
+
+
+def test_batch_reject_reports_per_draft_errors(draft_queue):
+    ids = draft_queue(2)
+    client.put(f"/api/v1/kb/drafts/{ids[1]}/reject", json={})
+    response = client.post("/api/v1/kb/drafts/batch_review",
+                           json={"action": "reject", "draft_ids": [ids[0], ids[1], "missing"], "feedback": "dup"})
+    results = {r["draft_id"]: r for r in response.json()["results"]}
+    assert results[ids[0]]["success"] is True
+    assert results[ids[1]] == {"draft_id": ids[1], "success": False, "kb_id": None,
+                               "error": "Draft not found or already processed"}
+    assert results["missing"]["success"] is False
+    assert _pending_ids() == ([], 0)
+
+
+def test_batch_review_rejects_unknown_action(draft_queue):
+    ids = draft_queue(1)
+    assert client.post("/api/v1/kb/drafts/batch_review", json={"action": "publish", "draft_ids": ids}).status_code == 422
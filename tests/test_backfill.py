@@ -0,0 +1,55 @@
+import json
+
+import backfill
+
+
+def _write_tickets(path, tickets):
+    path.write_text("".join(json.dumps(ticket) + "\n" for ticket in tickets), encoding="utf-8")
+
+
+def _ticket(ticket_id, conversation_log=None):
+    return {"ticket_id": ticket_id, "title": "VPN drops", "description": "Disconnects hourly",
+            "resolution_details": "Disabled split tunnelling", "conversation_log": conversation_log}
+
+
+def test_dry_run_skips_checkpointed_and_duplicate_tickets(tmp_path, capsys):
+    tickets = tmp_path / "tickets.jsonl"
+    _write_tickets(tickets, [_ticket("T1"), _ticket("T1"), _ticket("T2"), _ticket("T3")])
+    checkpoint = tmp_path / "drafts.jsonl.checkpoint"
+    checkpoint.write_text("T2\n", encoding="utf-8")
+
+    assert backfill.main([str(tickets), "--output", str(tmp_path / "drafts.jsonl"), "--dry-run"]) == 0
+    out = capsys.readouterr().out
+    assert "Tickets: 2 (invalid lines: 0, already checkpointed: 1, duplicate IDs: 1)" in out
+
+
+def test_dry_run_estimate_uses_stripped_log():
+    signature = "\n".join(["--", "Jane Doe", "Tier 2 Support", "support@example.com"])
+    plain = backfill._estimate_ticket_tokens(backfill.TicketDataInput(**_ticket("T1", "Agent: Restart it.")))
+    signed = backfill._estimate_ticket_tokens(
+        backfill.TicketDataInput(**_ticket("T1", "Agent: Restart it.\n" + signature))
+    )
+    assert signed == plain
+
+
+def test_dry_run_counts_condensation_calls_for_long_logs():
+    long_log = "\n".join(f"Agent: step {i} " + "detail " * 30 for i in range(400))
+    calls, condense_prompt, condense_completion, draft_prompt = backfill._estimate_ticket_tokens(
+        backfill.TicketDataInput(**_ticket("T1", long_log))
+    )
+    assert calls > 1
+    assert condense_prompt > 0 and condense_completion > 0
+    assert draft_prompt < condense_prompt
+
+
+def test_workers_condense_sequentially(monkeypatch):
+    calls = {}
+
+    def fake_create(ticket, save=True, condense_max_concurrency=None):
+        calls["concurrency"] = condense_max_concurrency
+        return backfill.KBDraft(source_ticket_id=ticket.ticket_id, generated_title="t",
+                                generated_content_markdown="## Problem Description\nx", created_at="now")
+
+    monkeypatch.setattr(backfill, "create_kb_draft_from_ticket", fake_create)
+    backfill._generate_draft(backfill.TicketDataInput(**_ticket("T1")))
+    assert calls["concurrency"] == 1
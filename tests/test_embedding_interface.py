@@ -0,0 +1,42 @@
+import numpy as np
+
+from core.config import HASHING_EMBEDDING_DIM
+from core.embedding_interface import get_embedding, get_embeddings_batch, get_hashing_embeddings
+
+TEXTS = [
+    "How to reset your password from the login page",
+    "Password reset link not arriving in email",
+    "VPN disconnects every hour when split tunnelling is enabled",
+]
+
+
+def test_hashing_embeddings_have_fixed_dimension():
+    for embedding in get_hashing_embeddings(TEXTS + ["x", "a much longer text " * 200]):
+        assert len(embedding) == HASHING_EMBEDDING_DIM
+
+
+def test_hashing_embeddings_are_unit_length():
+    for embedding in get_hashing_embeddings(TEXTS):
+        assert abs(np.linalg.norm(embedding) - 1.0) < 1e-5
+
+
+def test_hashing_embeddings_are_deterministic():
+    assert get_hashing_embeddings(TEXTS) == get_hashing_embeddings(TEXTS)
+
+
+def test_batch_matches_single_text_embeddings():
+    batch = get_hashing_embeddings(TEXTS)
+    assert batch == [get_hashing_embeddings([text])[0] for text in TEXTS]
+    assert get_embeddings_batch(TEXTS) == batch
+    assert [get_embedding(text) for text in TEXTS] == batch
+
+
+def test_related_text_scores_higher_than_unrelated():
+    query, related, unrelated = get_hashing_embeddings(
+        ["I forgot my password and need to reset it"] + TEXTS[:1] + TEXTS[2:]
+    )
+    assert np.dot(query, related) > np.dot(query, unrelated)
+
+
+def test_empty_batch():
+    assert get_hashing_embeddings([]) == []
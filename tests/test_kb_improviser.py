@@ -0,0 +1,101 @@
+import pytest
+
+import agents.kb_improviser_agent as improviser
+from db import in_memory_db
+from db.in_memory_db import get_all_pending_suggestions, get_published_kb
+from db.sharded_index import ShardedVectorIndex
+from core.embedding_interface import get_embedding
+from models.schemas import KBArticle, TicketDataInput
+
+KBS = {
+    "kb-password": ("How to reset your password",
+                    "User forgot their password. Go to the login page, click Forgot Password, "
+                    "enter your email and follow the reset link."),
+    "kb-vpn": ("VPN disconnects every hour",
+               "The VPN client drops the connection hourly when split tunnelling is enabled. "
+               "Disable split tunnelling in the VPN client settings."),
+    "kb-printer": ("Printer shows offline",
+                   "The office printer appears offline. Restart the print spooler service and re-add the printer."),
+}
+
+TICKETS = [
+    ("P1", "Forgot password", "User forgot their password and cannot log in",
+     "Sent the password reset link from the login page"),
+    ("P2", "Password reset link", "User needs to reset password, forgot it",
+     "Clicked Forgot Password on the login page and followed the email link"),
+    ("P3", "Cannot reset password", "Forgot password, reset email", "Used the reset link in the email"),
+    ("V1", "VPN keeps dropping", "VPN client disconnects every hour",
+     "Disabled split tunnelling in the VPN client settings"),
+    ("V2", "VPN drops hourly", "VPN connection drops when split tunnelling is enabled", "Turned off split tunnelling"),
+    ("X1", "Cafeteria menu", "Asked about lunch options on Friday", "Shared the weekly menu"),
+]
+
+
+def test_similarity_join_drops_matches_below_threshold(monkeypatch):
+    article = get_published_kb("dummy-kb-001")
+    monkeypatch.setattr(improviser, "match_published_kbs", lambda embeddings: [(article, 0.95), (article, 0.5), None])
+    assert improviser.similarity_join([[1.0], [1.0], [1.0]], threshold=0.9) == [(article, 0.95), None, None]
+
+
+def test_llm_error_is_not_stored_as_suggestion(monkeypatch):
+    monkeypatch.setattr(improviser, "get_llm_response", lambda prompt: "Error: Could not get response from LLM.")
+    before = len(get_all_pending_suggestions())
+    assert improviser.suggest_kb_improvements("dummy-kb-001", "New workaround found.") is None
+    assert len(get_all_pending_suggestions()) == before
+
+
+@pytest.fixture
+def published_kbs(monkeypatch):
+    """A fresh store and index holding KBS, embedded with the (hashing) embedding provider."""
+    monkeypatch.setattr(in_memory_db, "db_published_kbs", {})
+    monkeypatch.setattr(in_memory_db, "vector_store_mimic", {})
+    monkeypatch.setattr(in_memory_db, "vector_index", ShardedVectorIndex(strategy="hash", num_shards=2))
+    for kb_id, (title, content) in KBS.items():
+        article = KBArticle(kb_id=kb_id, title=title, content_markdown=content,
+                            created_at="2025-01-01T00:00:00", last_updated_at="2025-01-01T00:00:00")
+        embedding = get_embedding(f"Title: {title}\nContent: {content}")
+        in_memory_db.db_published_kbs[kb_id] = article
+        in_memory_db.vector_store_mimic[kb_id] = (article, embedding)
+        in_memory_db.vector_index.add(kb_id, article.tags, embedding)
+
+
+def _tickets():
+    return [TicketDataInput(ticket_id=ticket_id, title=title, description=description, resolution_details=resolution)
+            for ticket_id, title, description, resolution in TICKETS]
+
+
+def test_match_tickets_to_kbs_groups_by_best_kb(published_kbs):
+    matches = improviser.match_tickets_to_kbs(_tickets(), batch_size=4, threshold=0.5)
+    grouped = {kb_id: sorted(ticket.ticket_id for ticket, _score in hits) for kb_id, hits in matches.items()}
+    assert grouped == {"kb-password": ["P1", "P2", "P3"], "kb-vpn": ["V1", "V2"]}
+
+
+def test_one_llm_call_per_matched_kb_with_top_tickets(published_kbs, monkeypatch):
+    prompts = []
+
+    response = "## Suggested Changes\n- Mention the reset email can take minutes\n## Reasoning\nSeen in tickets"
+
+    def fake_llm(prompt):
+        prompts.append(prompt)
+        return response
+
+    monkeypatch.setattr(improviser, "get_llm_response", fake_llm)
+    suggestions = improviser.suggest_improvements_from_tickets(_tickets(), batch_size=4, threshold=0.5,
+                                                               max_tickets_per_kb=2)
+    assert len(prompts) == 2
+    assert sorted(s.kb_id for s in suggestions) == ["kb-password", "kb-vpn"]
+
+    password = next(s for s in suggestions if s.kb_id == "kb-password")
+    # Highest-scoring tickets first, truncated to max_tickets_per_kb
+    password_tickets = _tickets()[:3]
+    hits = improviser.similarity_join(
+        improviser.get_embeddings_batch([improviser._ticket_embedding_text(t) for t in password_tickets]), 0.5)
+    scores = {ticket.ticket_id: score for ticket, (_article, score) in zip(password_tickets, hits)}
+    expected = sorted(scores, key=scores.get, reverse=True)[:2]
+    assert password.source_info == "Tickets: " + ", ".join(expected)
+    password_prompt = next(p for p in prompts if "How to reset your password" in p)
+    excluded = (set(scores) - set(expected)).pop()
+    assert f"Ticket {excluded} " not in password_prompt
+    assert password_prompt.index(f"Ticket {expected[0]} ") < password_prompt.index(f"Ticket {expected[1]} ")
+    assert password.suggested_changes == response
+    assert {s.suggestion_id for s in suggestions} <= {s.suggestion_id for s in get_all_pending_suggestions()}
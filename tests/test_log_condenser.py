@@ -0,0 +1,126 @@
+from agents import log_condenser
+from agents.log_condenser import (
+    strip_boilerplate, split_into_segments, condense_conversation_log, SIGNATURE_MAX_LINES
+)
+from core.llm_interface import count_tokens
+
+
+def test_signature_ends_at_next_speaker_turn():
+    log = (
+        "Agent: Please clear the cache and retry.\n"
+        "--\n"
+        "Jane Doe, Tier 2 Support\n"
+        "Customer: That worked, but only after I also disabled the VPN.\n"
+        "Agent: ... The VPN split-tunnel setting was the root cause."
+    )
+    assert strip_boilerplate(log) == (
+        "Agent: Please clear the cache and retry.\n"
+        "Customer: That worked, but only after I also disabled the VPN.\n"
+        "Agent: ... The VPN split-tunnel setting was the root cause."
+    )
+
+
+def test_signature_ends_at_blank_line():
+    log = "Agent: Restart the service.\n--\nJane Doe\nSupport Team\n\nThe service came back after a restart."
+    assert strip_boilerplate(log) == "Agent: Restart the service.\nThe service came back after a restart."
+
+
+def test_signature_is_capped_at_a_few_lines():
+    signature = [f"signature line {i}" for i in range(SIGNATURE_MAX_LINES)]
+    log = "\n".join(["Agent: Check the logs.", "--"] + signature + ["the disk was full"])
+    assert strip_boilerplate(log) == "Agent: Check the logs.\nthe disk was full"
+
+
+def test_quoted_reply_is_removed():
+    log = (
+        "Customer: Still failing after the update.\n"
+        "On Mon, Jan 6, 2025 at 10:00 AM Support <support@example.com> wrote:\n"
+        "> Please install the latest update.\n"
+        "> Thanks"
+    )
+    assert strip_boilerplate(log) == "Customer: Still failing after the update."
+
+
+def test_original_message_block_runs_until_next_speaker_turn():
+    log = (
+        "Agent: Forwarding to engineering.\n"
+        "-----Original Message-----\n"
+        "From: customer@example.com\n"
+        "Subject: Login fails\n"
+        "I cannot log in since yesterday.\n"
+        "Engineer: The SSO certificate had expired; renewed it."
+    )
+    assert strip_boilerplate(log) == (
+        "Agent: Forwarding to engineering.\n"
+        "Engineer: The SSO certificate had expired; renewed it."
+    )
+
+
+def test_blank_runs_and_repeated_lines_are_collapsed():
+    log = "Agent: Hello\n\n\n\nAgent: Hello\nAgent: Hello\nCustomer: Hi"
+    assert strip_boilerplate(log) == "Agent: Hello\n\nAgent: Hello\nCustomer: Hi"
+
+
+def test_split_into_segments_keeps_all_lines_in_order():
+    lines = [f"Agent: step {i} " + "x" * 40 for i in range(20)]
+    segments = split_into_segments("\n".join(lines), segment_tokens=60)
+    assert len(segments) > 1
+    assert "\n".join(segments).splitlines() == lines
+
+
+def test_split_into_segments_cuts_oversized_line():
+    line = "y" * 1000
+    segments = split_into_segments("Agent: short\n" + line, segment_tokens=50)
+    assert segments[0] == "Agent: short"
+    assert "".join(segments[1:]) == line
+    assert all(len(segment) <= 200 for segment in segments[1:])
+
+
+def test_contact_fields_stay_in_the_signature():
+    log = (
+        "Agent: Reinstall the client.\n"
+        "--\n"
+        "Jane Doe\n"
+        "Phone: 555-1234\n"
+        "Email: jane@example.com\n"
+        "Customer: Reinstalling fixed it."
+    )
+    assert strip_boilerplate(log) == "Agent: Reinstall the client.\nCustomer: Reinstalling fixed it."
+
+
+def test_empty_stripped_log_is_not_replaced_by_the_raw_log():
+    from agents.kb_creator_agent import build_kb_creation_prompt
+    from models.schemas import TicketDataInput
+
+    raw = "> Please try again\n> Thanks\nSent from my iPhone"
+    ticket = TicketDataInput(ticket_id="T1", title="t", description="d", resolution_details="r", conversation_log=raw)
+    log, report = condense_conversation_log(raw)
+    assert log == "" and report.final_tokens == 0
+    prompt = build_kb_creation_prompt(ticket, log)
+    assert "Please try again" not in prompt and "iPhone" not in prompt
+    assert "Conversation Log (optional): N/A" in prompt
+
+
+def test_condensed_log_is_reduced_until_it_fits(monkeypatch):
+    prompts = []
+
+    def fake_llm(prompt, max_tokens=None, temperature=None):
+        prompts.append(prompt)
+        return "summary " * 100 # ~100+ tokens per segment, whatever the input
+
+    monkeypatch.setattr(log_condenser, "get_llm_response", fake_llm)
+    log = "\n".join(f"Agent: step {i} " + "detail " * 40 for i in range(300))
+    result, report = condense_conversation_log(log, token_threshold=500, segment_tokens=400)
+    first_round = len(split_into_segments(strip_boilerplate(log), 400))
+    assert len(prompts) > first_round # At least one reduce round ran
+    assert report.segments == len(prompts)
+    assert count_tokens(result) <= 500
+    assert report.final_tokens <= 500
+
+
+def test_reduce_stops_and_truncates_when_llm_fails(monkeypatch):
+    monkeypatch.setattr(log_condenser, "get_llm_response", lambda prompt, **kwargs: "Error: LLM unavailable")
+    log = "\n".join(f"Agent: step {i} " + "detail " * 40 for i in range(100))
+    result, report = condense_conversation_log(log, token_threshold=300, segment_tokens=400)
+    assert count_tokens(result) <= 300
+    assert result.startswith("Agent: step 0")
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from core.profiling import SamplingProfiler
+
+
+def _busy_request_work(seconds):
+    deadline = time.monotonic() + seconds
+    total = 0
+    while time.monotonic() < deadline:
+        total += sum(range(100))
+    return total
+
+
+def test_samples_only_threads_executing_requests():
+    profiler = SamplingProfiler()
+    idle_stop = threading.Event()
+    idle_thread = threading.Thread(target=idle_stop.wait, daemon=True)
+    idle_thread.start()
+
+    def request_thread():
+        profiler.enter_request_thread()
+        try:
+            _busy_request_work(0.3)
+        finally:
+            profiler.exit_request_thread()
+
+    def unrelated_busy_thread():
+        _busy_request_work(0.3)
+
+    workers = [threading.Thread(target=request_thread), threading.Thread(target=unrelated_busy_thread)]
+    assert profiler.start(duration_seconds=2.0, interval_ms=5)
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    profiler.stop()
+    idle_stop.set()
+
+    stacks = profiler.collapsed_stacks()
+    assert profiler.sample_count > 0
+    assert "request_thread" in stacks
+    assert "unrelated_busy_thread" not in stacks
+    assert "wait (" not in stacks
+    assert not profiler.request_threads
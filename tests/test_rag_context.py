@@ -0,0 +1,87 @@
+from agents.kb_retriever_agent import assemble_rag_context, MIN_PARTIAL_PASSAGE_TOKENS
+from core.llm_interface import count_tokens
+from models.schemas import KBArticle
+
+
+def _article(title, passages):
+    return KBArticle(title=title, content_markdown="\n\n".join(passages), created_at="2025-01-01T00:00:00",
+                     last_updated_at="2025-01-01T00:00:00")
+
+
+def _passage(topic, words=60):
+    return " ".join(f"{topic}{i}" for i in range(words))
+
+
+def test_context_stays_within_budget():
+    articles = [(_article(f"Article {n}", [_passage(f"a{n}p{p}") for p in range(5)]), 1.0 - n / 10) for n in range(5)]
+    for budget in (50, 200, 500, 1000):
+        context, used = assemble_rag_context(articles, budget)
+        assert used <= budget
+        assert count_tokens(context) <= budget
+
+
+def test_highest_scoring_article_fills_first():
+    low = _article("Low score", [_passage("low")])
+    high = _article("High score", [_passage("high")])
+    context, _ = assemble_rag_context([(low, 0.2), (high, 0.9)], 10_000)
+    assert context.index("Title: High score") < context.index("Title: Low score")
+
+
+def test_whole_budget_used_when_everything_fits():
+    article = _article("Small", ["Restart the service.", "Clear the cache."])
+    context, used = assemble_rag_context([(article, 1.0)], 10_000)
+    assert "Restart the service." in context and "Clear the cache." in context
+    assert used > 0
+
+
+def test_last_passage_is_truncated_to_fit():
+    first = _passage("first", 40)
+    second = _passage("second", 400)
+    article = _article("Long", [first, second])
+    budget = count_tokens("Title: Long\nContent:") + 2 + count_tokens(first) + 1 + MIN_PARTIAL_PASSAGE_TOKENS * 2
+    context, used = assemble_rag_context([(article, 1.0)], budget)
+    assert first in context
+    assert "second0" in context
+    assert second not in context
+    assert used <= budget
+
+
+def test_partial_passage_below_minimum_is_skipped():
+    first = _passage("first", 40)
+    article = _article("Long", [first, _passage("second", 400)])
+    budget = count_tokens("Title: Long\nContent:") + 2 + count_tokens(first) + 1 + MIN_PARTIAL_PASSAGE_TOKENS // 2
+    context, _ = assemble_rag_context([(article, 1.0)], budget)
+    assert first in context
+    assert "second0" not in context
+
+
+def test_overlapping_passages_are_deduplicated():
+    shared = "To reset the password open settings then choose security and click reset password now"
+    first = _article("First", [shared])
+    second = _article("Second", [shared + " please", "A distinct passage about VPN split tunnels."])
+    context, _ = assemble_rag_context([(first, 0.9), (second, 0.8)], 10_000)
+    assert context.count("To reset the password") == 1
+    assert "VPN split tunnels" in context
+
+
+def test_article_with_only_duplicate_passages_is_omitted():
+    shared = "Clear the browser cache and sign in again to refresh the session token"
+    context, _ = assemble_rag_context([(_article("First", [shared]), 0.9), (_article("Copy", [shared]), 0.8)], 10_000)
+    assert "Title: Copy" not in context
+
+
+def test_budget_holds_when_tiktoken_encoding_cannot_load(monkeypatch):
+    import core.llm_interface as llm_interface
+
+    def offline(*_args, **_kwargs):
+        raise ConnectionError("BPE download unavailable")
+
+    monkeypatch.setattr(llm_interface, "_tokenizer_cache", {})
+    if llm_interface.tiktoken is not None:
+        monkeypatch.setattr(llm_interface.tiktoken, "encoding_for_model", offline)
+        monkeypatch.setattr(llm_interface.tiktoken, "get_encoding", offline)
+
+    articles = [(_article(f"Article {n}", [_passage(f"a{n}p{p}") for p in range(5)]), 1.0) for n in range(3)]
+    context, used = assemble_rag_context(articles, 300)
+    assert 0 < used <= 300
+    assert count_tokens(context) <= 300
@@ -0,0 +1,116 @@
+import numpy as np
+
+from db.sharded_index import ShardedVectorIndex, MIN_SHARD_CAPACITY
+
+
+def _entries(count, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    products = ["billing", "login", "vpn"]
+    return [(f"kb-{i}", [products[i % len(products)]], rng.standard_normal(dim).tolist()) for i in range(count)]
+
+
+def test_incremental_adds_match_a_full_build():
+    entries = _entries(3 * MIN_SHARD_CAPACITY + 5)
+    built = ShardedVectorIndex(strategy="tag")
+    built.build(entries)
+    grown = ShardedVectorIndex(strategy="tag")
+    for kb_id, tags, embedding in entries:
+        assert grown.add(kb_id, tags, embedding)
+
+    assert grown.total_rows() == built.total_rows() == len(entries)
+    assert grown.shard_keys() == ["billing", "login", "vpn"]
+    query = entries[7][2]
+    assert [kb_id for kb_id, _ in grown.search(query, 5)] == [kb_id for kb_id, _ in built.search(query, 5)]
+    assert grown.search(query, 1)[0][0] == "kb-7"
+
+
+def test_search_routes_tag_hints_to_their_shards():
+    index = ShardedVectorIndex(strategy="tag")
+    index.build(_entries(30))
+    hits = index.search(_entries(30)[0][2], 10, shard_hints=["Login"])
+    assert hits and all(int(kb_id.split("-")[1]) % 3 == 1 for kb_id, _ in hits)
+
+
+def test_mismatched_dimension_is_rejected():
+    index = ShardedVectorIndex()
+    assert index.add("kb-1", [], [1.0, 0.0])
+    assert not index.add("kb-2", [], [1.0, 0.0, 0.0])
+    assert index.total_rows() == 1
+
+
+def test_best_matches_across_shards():
+    index = ShardedVectorIndex(strategy="hash", num_shards=3)
+    for kb_id, tags, embedding in _entries(40):
+        index.add(kb_id, tags, embedding)
+    queries = [_entries(40)[i][2] for i in (3, 17, 31)]
+    hits = index.best_matches(queries)
+    assert [kb_id for kb_id, _ in hits] == ["kb-3", "kb-17", "kb-31"]
+    assert all(abs(score - 1.0) < 1e-5 for _, score in hits)
+    assert index.best_matches([[1.0, 2.0]]) == [None]
+
+
+def test_pool_search_over_shared_memory_survives_growth():
+    entries = _entries(4 * MIN_SHARD_CAPACITY)
+    index = ShardedVectorIndex(strategy="tag", workers=2, parallel_min_rows=0)
+    try:
+        for kb_id, tags, embedding in entries[:10]:
+            index.add(kb_id, tags, embedding)
+        assert index.search(entries[4][2], 1)[0][0] == "kb-4"
+        pool = index._pool
+        assert pool is not None
+
+        for kb_id, tags, embedding in entries[10:]:
+            index.add(kb_id, tags, embedding) # Outgrows the first shared memory segments
+        assert index._pool is pool # The same workers keep serving searches
+        assert index.search(entries[-1][2], 1)[0][0] == entries[-1][0]
+    finally:
+        index.close()
+
+
+def test_unsharded_index_never_uses_shared_memory():
+    index = ShardedVectorIndex(strategy="none", workers=8, parallel_min_rows=0)
+    for kb_id, tags, embedding in _entries(3 * MIN_SHARD_CAPACITY):
+        index.add(kb_id, tags, embedding)
+    assert all(shard.segment is None for shard in index.shards.values())
+    assert index.search(_entries(3 * MIN_SHARD_CAPACITY)[5][2], 1)[0][0] == "kb-5"
+    assert index._pool is None
+
+
+def test_buffers_move_to_shared_memory_when_pool_eligible():
+    entries = _entries(40)
+    index = ShardedVectorIndex(strategy="hash", num_shards=3, workers=2, parallel_min_rows=30)
+    try:
+        for kb_id, tags, embedding in entries[:29]:
+            index.add(kb_id, tags, embedding)
+        assert all(shard.segment is None for shard in index.shards.values())
+        for kb_id, tags, embedding in entries[29:]:
+            index.add(kb_id, tags, embedding)
+        assert all(shard.segment is not None for shard in index.shards.values())
+        assert index.search(entries[12][2], 1)[0][0] == "kb-12"
+    finally:
+        index.close()
+
+
+def test_outgrown_segment_is_unlinked_only_after_searches_release_it():
+    from multiprocessing.shared_memory import SharedMemory
+    import pytest
+
+    entries = _entries(4 * MIN_SHARD_CAPACITY)
+    index = ShardedVectorIndex(strategy="tag", workers=2, parallel_min_rows=0)
+    try:
+        for kb_id, tags, embedding in entries[:6]:
+            index.add(kb_id, tags, embedding)
+        with index._lock:
+            acquired = index._acquire(["billing"])
+        segment = acquired[0][3]
+        del acquired
+        for kb_id, tags, embedding in entries[6:]:
+            index.add(kb_id, tags, embedding) # Grows past the pinned segment
+        assert segment.retired and index.shards["billing"].segment is not segment
+        SharedMemory(name=segment.shm.name).close() # Still attachable while pinned
+
+        index._release([segment])
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=segment.shm.name)
+    finally:
+        index.close()
@@ -1,27 +1,81 @@
 import gradio as gr
 import requests # To call FastAPI backend
+from requests.adapters import HTTPAdapter
 import json
 import datetime
 
 FASTAPI_BASE_URL = "http://127.0.0.1:8000/api/v1"
+# (connect, read) timeouts in seconds; calls that wait on the LLM get a longer read timeout
+REQUEST_TIMEOUT = (3.05, 15)
+LLM_REQUEST_TIMEOUT = (3.05, 120)
+DRAFTS_PAGE_SIZE = 50
+
+# One pooled keep-alive session for all backend calls (Gradio runs handlers on worker threads)
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
 
 # --- Helper functions to interact with FastAPI ---
-def get_pending_drafts_choices():
+def fetch_pending_drafts_page(after=None, limit=DRAFTS_PAGE_SIZE):
+    """Returns (choices, total) for the page of the pending-draft queue after draft_id `after`."""
+    # Only the fields needed for the dropdown; draft bodies are loaded on selection
+    params = {"fields": "draft_id,generated_title", "limit": limit}
+    if after:
+        params["after"] = after
+    response = session.get(f"{FASTAPI_BASE_URL}/kb/drafts/pending", params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    drafts = response.json()
+    total = int(response.headers.get("X-Total-Count", len(drafts)))
+    # Return choices as (display_name, value) for Gradio dropdown
+    return [(f"{d['generated_title'][:50]}... (ID: {d['draft_id'][:8]})", d['draft_id']) for d in drafts], total
+
+def _queue_outputs(choices, total, status=None, reset_selection=True):
+    """Outputs shared by every handler that changes the loaded queue, updating widgets in place."""
+    info = f"Showing {len(choices)} of {total} pending drafts."
+    if reset_selection:
+        single_update = gr.update(choices=choices, value=None)
+        multi_update = gr.update(choices=choices, value=[])
+    else:
+        single_update = gr.update(choices=choices)
+        multi_update = gr.update(choices=choices)
+    return (
+        choices,
+        total,
+        single_update,
+        multi_update,
+        info if status is None else f"{info} {status}"
+    )
+
+def load_first_page():
     try:
-        response = requests.get(f"{FASTAPI_BASE_URL}/kb/drafts/pending")
-        response.raise_for_status()
-        drafts = response.json()
-        # Return choices as (display_name, value) for Gradio dropdown
-        return [(f"{d['generated_title'][:50]}... (ID: {d['draft_id'][:8]})", d['draft_id']) for d in drafts]
+        choices, total = fetch_pending_drafts_page()
+        return _queue_outputs(choices, total)
+    except Exception as e:
+        print(f"Error fetching drafts: {e}")
+        return _queue_outputs([], 0, f"Error fetching drafts: {e}")
+
+def load_next_page(choices, total):
+    # Page after the last loaded draft: drafts cleared meanwhile (here or by another
+    # reviewer) can't shift the window and skip unseen ones, as an offset would
+    try:
+        page, total = fetch_pending_drafts_page(choices[-1][1] if choices else None)
+        loaded_ids = {draft_id for _, draft_id in choices}
+        choices = list(choices) + [c for c in page if c[1] not in loaded_ids]
+        return _queue_outputs(choices, total, reset_selection=False)
     except Exception as e:
         print(f"Error fetching drafts: {e}")
-        return []
+        return _queue_outputs(choices, total, f"Error fetching drafts: {e}", reset_selection=False)
+
+def _remove_from_queue(choices, total, draft_ids):
+    draft_ids = set(draft_ids)
+    remaining = [c for c in choices if c[1] not in draft_ids]
+    return remaining, max(total - (len(choices) - len(remaining)), 0)
 
 def load_draft_details(draft_id):
     if not draft_id:
         return "", "", "", "", "", "", "" # Clear fields
     try:
-        response = requests.get(f"{FASTAPI_BASE_URL}/kb/drafts/{draft_id}")
+        response = session.get(f"{FASTAPI_BASE_URL}/kb/drafts/{draft_id}", timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         draft = response.json()
         tags_str = ", ".join(draft.get('suggested_tags', []))
@@ -48,7 +102,7 @@ def approve_kb_draft(draft_id, final_title, final_content, final_tags_str, feedb
             "final_content_markdown": final_content,
             "final_tags": tags_list
         }
-        response = requests.put(f"{FASTAPI_BASE_URL}/kb/drafts/{draft_id}/approve", json=payload)
+        response = session.put(f"{FASTAPI_BASE_URL}/kb/drafts/{draft_id}/approve", json=payload, timeout=LLM_REQUEST_TIMEOUT)
         response.raise_for_status()
         return f"Draft {draft_id} approved successfully! Published KB: {response.json().get('kb_id')}"
     except Exception as e:
@@ -61,19 +115,63 @@ def reject_kb_draft(draft_id, feedback="Rejected via Gradio"):
         feedback = "Rejected without specific feedback via Gradio."
     try:
         payload = {"feedback": feedback}
-        response = requests.put(f"{FASTAPI_BASE_URL}/kb/drafts/{draft_id}/reject", json=payload)
+        response = session.put(f"{FASTAPI_BASE_URL}/kb/drafts/{draft_id}/reject", json=payload, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         return f"Draft {draft_id} rejected. Feedback: {feedback}"
     except Exception as e:
         return f"Error rejecting draft {draft_id}: {e}"
 
+def approve_and_update_queue(draft_id, final_title, final_content, final_tags_str, feedback, choices, total):
+    status = approve_kb_draft(draft_id, final_title, final_content, final_tags_str, feedback)
+    if "approved successfully" in status:
+        choices, total = _remove_from_queue(choices, total, [draft_id])
+    return (status,) + _queue_outputs(choices, total)
+
+def reject_and_update_queue(draft_id, feedback, choices, total):
+    status = reject_kb_draft(draft_id, feedback)
+    if not status.startswith("Error"):
+        choices, total = _remove_from_queue(choices, total, [draft_id])
+    return (status,) + _queue_outputs(choices, total)
+
+def batch_review_drafts(action, draft_ids, feedback, choices, total):
+    """Approves or rejects all selected drafts with a single API call."""
+    if not draft_ids:
+        return ("No drafts selected.",) + _queue_outputs(choices, total)
+    payload = {"action": action, "draft_ids": list(draft_ids)}
+    if action == "reject":
+        payload["feedback"] = feedback or "Rejected without specific feedback via Gradio (batch)."
+    try:
+        response = session.post(f"{FASTAPI_BASE_URL}/kb/drafts/batch_review", json=payload, timeout=LLM_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        results = response.json()["results"]
+    except Exception as e:
+        return (f"Error running batch {action}: {e}",) + _queue_outputs(choices, total)
+
+    succeeded = [r["draft_id"] for r in results if r["success"]]
+    failed = [f"{r['draft_id'][:8]} ({r.get('error')})" for r in results if not r["success"]]
+    status = f"Batch {action}: {len(succeeded)} succeeded, {len(failed)} failed."
+    if failed:
+        status += " Failed: " + ", ".join(failed)
+    # Drafts that failed as already processed are gone server-side too
+    gone = succeeded + [r["draft_id"] for r in results if not r["success"] and "already processed" in (r.get("error") or "")]
+    choices, total = _remove_from_queue(choices, total, gone)
+    return (status,) + _queue_outputs(choices, total)
+
+def batch_approve_drafts(draft_ids, feedback, choices, total):
+    return batch_review_drafts("approve", draft_ids, feedback, choices, total)
+
+def batch_reject_drafts(draft_ids, feedback, choices, total):
+    return batch_review_drafts("reject", draft_ids, feedback, choices, total)
+
 def search_kb(query, top_k=3, synthesize=False):
     if not query:
         return "Please enter a search query.", ""
     try:
         params = {"synthesize_answer": synthesize}
         payload = {"query": query, "top_k": int(top_k)}
-        response = requests.post(f"{FASTAPI_BASE_URL}/kb/search", params=params, json=payload)
+        params["fields"] = "kb_id,title,content_snippet,score" # Only what is rendered below
+        response = session.post(f"{FASTAPI_BASE_URL}/kb/search", params=params, json=payload,
+                                timeout=LLM_REQUEST_TIMEOUT if synthesize else REQUEST_TIMEOUT)
         response.raise_for_status()
         search_response_data = response.json()
         
@@ -105,10 +203,11 @@ def create_example_draft():
         "tags": ["login", "password", "cache"]
     }
     try:
-        response = requests.post(f"{FASTAPI_BASE_URL}/kb/drafts/from_ticket", json=ticket_payload)
+        response = session.post(f"{FASTAPI_BASE_URL}/kb/drafts/from_ticket", json=ticket_payload,
+                                params={"fields": "draft_id"}, timeout=LLM_REQUEST_TIMEOUT)
         response.raise_for_status()
         draft = response.json()
-        return f"Example draft created: {draft['draft_id']}. Refresh pending drafts list."
+        return f"Example draft created: {draft['draft_id']}."
     except Exception as e:
         return f"Error creating example draft: {e}"
 
@@ -118,12 +217,25 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
 
     with gr.Tabs():
         with gr.TabItem("KB Draft Review"):
+            # Loaded queue as (label, draft_id) pairs and the server-side queue size
+            drafts_state = gr.State([])
+            drafts_total_state = gr.State(0)
+
             with gr.Row():
-                pending_drafts_dropdown = gr.Dropdown(label="Select Pending Draft", choices=get_pending_drafts_choices(), interactive=True)
+                # Choices are filled after the page loads (see demo.load) so a slow API can't block the UI build
+                pending_drafts_dropdown = gr.Dropdown(label="Select Pending Draft", choices=[], interactive=True)
                 refresh_drafts_btn = gr.Button("Refresh Drafts List")
+                load_more_drafts_btn = gr.Button(f"Load Next {DRAFTS_PAGE_SIZE}")
                 create_example_draft_btn = gr.Button("Create Example Draft (Demo)")
-            
+            queue_info = gr.Markdown("Loading pending drafts...")
+
             output_status_review = gr.Textbox(label="Action Status", interactive=False)
+
+            with gr.Accordion("Batch Review", open=False):
+                batch_drafts_select = gr.Dropdown(label="Select Drafts (approved as generated)", choices=[], multiselect=True, interactive=True)
+                with gr.Row():
+                    batch_approve_btn = gr.Button("Approve Selected")
+                    batch_reject_btn = gr.Button("Reject Selected")
             
             draft_id_hidden = gr.Textbox(label="Draft ID (Hidden)", visible=False) # Keep track of current draft
 
@@ -158,16 +270,22 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
         # TODO: Add KB Improviser UI Tab later
 
     # --- Event Handlers ---
-    refresh_drafts_btn.click(
-        fn=get_pending_drafts_choices,
-        outputs=pending_drafts_dropdown
+    queue_outputs = [drafts_state, drafts_total_state, pending_drafts_dropdown, batch_drafts_select, queue_info]
+
+    demo.load(fn=load_first_page, outputs=queue_outputs)
+    refresh_drafts_btn.click(fn=load_first_page, outputs=queue_outputs)
+    load_more_drafts_btn.click(
+        fn=load_next_page,
+        inputs=[drafts_state, drafts_total_state],
+        outputs=queue_outputs
     )
     create_example_draft_btn.click(
         fn=create_example_draft,
         outputs=output_status_review
     ).then(
-        fn=get_pending_drafts_choices, # Refresh dropdown after creating
-        outputs=pending_drafts_dropdown
+        fn=load_next_page, # Appends the new draft without re-downloading the loaded queue
+        inputs=[drafts_state, drafts_total_state],
+        outputs=queue_outputs
     )
 
     pending_drafts_dropdown.change(
@@ -176,22 +294,29 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
         outputs=[draft_id_hidden, final_kb_title, final_kb_content, final_kb_tags, draft_problem_desc, draft_cause, draft_resolution_steps]
     )
 
+    # After an action the handled drafts are removed from the loaded queue in place
     approve_btn.click(
-        fn=approve_kb_draft,
-        inputs=[draft_id_hidden, final_kb_title, final_kb_content, final_kb_tags, reject_feedback_text], # feedback used as placeholder
-        outputs=output_status_review
-    ).then(
-        fn=get_pending_drafts_choices, # Refresh dropdown after action
-        outputs=pending_drafts_dropdown
+        fn=approve_and_update_queue,
+        inputs=[draft_id_hidden, final_kb_title, final_kb_content, final_kb_tags, reject_feedback_text, drafts_state, drafts_total_state], # feedback used as placeholder
+        outputs=[output_status_review] + queue_outputs
     )
 
     reject_btn.click(
-        fn=reject_kb_draft,
-        inputs=[draft_id_hidden, reject_feedback_text],
-        outputs=output_status_review
-    ).then(
-        fn=get_pending_drafts_choices, # Refresh dropdown after action
-        outputs=pending_drafts_dropdown
+        fn=reject_and_update_queue,
+        inputs=[draft_id_hidden, reject_feedback_text, drafts_state, drafts_total_state],
+        outputs=[output_status_review] + queue_outputs
+    )
+
+    batch_approve_btn.click(
+        fn=batch_approve_drafts,
+        inputs=[batch_drafts_select, reject_feedback_text, drafts_state, drafts_total_state],
+        outputs=[output_status_review] + queue_outputs
+    )
+
+    batch_reject_btn.click(
+        fn=batch_reject_drafts,
+        inputs=[batch_drafts_select, reject_feedback_text, drafts_state, drafts_total_state],
+        outputs=[output_status_review] + queue_outputs
     )
     
     search_kb_btn.click(